@@ -3,12 +3,14 @@ from .settings import DEBUG
 
 # Application definition
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    # django.contrib.admin с сайтом movies.sites.MoviesAdminSite
+    'movies.apps.MoviesAdminConfig',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'movies.apps.MoviesConfig',
 ]
 
@@ -0,0 +1,22 @@
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# Бэкенд выбирается переменной CACHE_BACKEND. locmem живёт внутри процесса: при нескольких
+# воркерах gunicorn сигнал об изменении данных сбросит кэш только в одном из них, поэтому
+# для них нужен общий бэкенд — file (каталог CACHE_LOCATION на одной машине), db (таблица
+# CACHE_LOCATION, создаётся manage.py createcachetable) или memcached (host:port, нужен pymemcache).
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[os.environ.get('CACHE_BACKEND', 'locmem')],
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+        # записи в обход Django (bulk_create, load_data.py) не сбрасывают кэш и видны через TIMEOUT секунд
+        'TIMEOUT': int(os.environ.get('CACHE_TIMEOUT', 300)),
+    }
+}
@@ -1,6 +1,14 @@
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Пулер соединений в режиме transaction (pgbouncer) не передаёт серверу параметр
+# options, поэтому за ним search_path задаётся ролью: ALTER ROLE <user> SET search_path = public, content;
+DB_TRANSACTION_POOLER = os.environ.get('DB_TRANSACTION_POOLER', False) == 'True'
+
+# Сколько секунд соединение переиспользуется между запросами: 0 — новое на каждый запрос,
+# None — без ограничения
+DB_CONN_MAX_AGE = os.environ.get('DB_CONN_MAX_AGE', '0')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -9,7 +17,12 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD'),
         'HOST': os.environ.get('DB_HOST', '127.0.0.1'),
         'PORT': os.environ.get('DB_PORT', 5432),
-        'OPTIONS': {
+        'CONN_MAX_AGE': None if DB_CONN_MAX_AGE == 'None' else int(DB_CONN_MAX_AGE),
+        # Проверять переиспользуемое соединение в начале запроса (в Django 3.2 — movies.db.check_connections)
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', False) == 'True',
+        # Именованные курсоры QuerySet.iterator() за пулером работают только внутри транзакции (movies.db.stream)
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('DB_DISABLE_SERVER_SIDE_CURSORS', False) == 'True',
+        'OPTIONS': {} if DB_TRANSACTION_POOLER else {
             # Нужно явно указать схемы, с которыми будет работать приложение.
             'options': '-c search_path=public,content'
         }
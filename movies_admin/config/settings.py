@@ -31,6 +31,7 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 include(
     'components/database.py',
+    'components/cache.py',
     'components/applications.py',
     'components/middleware.py',
     'components/templates.py',
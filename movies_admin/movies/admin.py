@@ -1,37 +1,154 @@
+import uuid
+
 from django.contrib import admin
-from .models import Genre, Filmwork, GenreFilmwork, Person, PersonFilmwork
+from django.contrib.postgres.search import SearchQuery
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils.translation import gettext_lazy as _
+
+from .export import FORMATS, export_chunks
+from .models import SEARCH_CONFIG, Genre, Filmwork, GenreFilmwork, Person, PersonFilmwork
+from .pagination import EstimatedCountPaginator, KeysetChangeList
+from .queries import names_subquery
+from .widgets import PreloadedAutocompleteSelect, PreloadedInlineFormSet
+
+
+class IndexedSearchMixin:
+    """Поиск в админке по индексам вместо ILIKE '%term%' по каждому из search_fields.
+
+    UUID ищется точным совпадением по первичному ключу, остальной ввод —
+    условием из search_filter (по умолчанию — начало любого из search_fields).
+    Неупорядоченный результат сортируется по первичному ключу, чтобы страницы
+    автодополнения не пересекались.
+    """
+
+    def search_filter(self, term):
+        opts = self.model._meta
+        condition = Q(pk__in=[])
+        for name in self.search_fields:
+            name = name.lstrip('^=@')
+            if name in ('pk', opts.pk.name):
+                continue
+            # ILIKE 'term%' без UPPER() может идти по GIN-индексу gin_trgm_ops (movies.lookups)
+            field = opts.get_field(name) if '__' not in name else None
+            lookup = 'iprefix' if field is not None and field.get_lookup('iprefix') else 'istartswith'
+            condition |= Q(**{f'{name}__{lookup}': term})
+        return condition
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if term:
+            try:
+                queryset = queryset.filter(pk=uuid.UUID(term))
+            except ValueError:
+                queryset = queryset.filter(self.search_filter(term))
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        return queryset, False
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список без точного COUNT(*) на больших таблицах и без второго подсчёта всех строк"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class AutocompleteInline(admin.TabularInline):
+    """Инлайн с автодополнением вместо <select> со всеми строками связанной таблицы.
+
+    Подписи выбранных значений всех строк читаются одним запросом и кэшируются
+    на объект (см. PreloadedInlineFormSet), без запроса на каждую строку.
+    """
+    formset = PreloadedInlineFormSet
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request) and 'widget' not in kwargs:
+            kwargs['widget'] = PreloadedAutocompleteSelect(db_field, self.admin_site, using=kwargs.get('using'))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
-class GenreFilmworkInline(admin.TabularInline):
+class GenreFilmworkInline(AutocompleteInline):
     model = GenreFilmwork
+    autocomplete_fields = ('genre',)
 
 
-class PersonFilmworkInline(admin.TabularInline):
+class PersonFilmworkInline(AutocompleteInline):
     model = PersonFilmwork
+    autocomplete_fields = ('person',)
 
 
 @admin.register(Filmwork)
-class FilmworkAdmin(admin.ModelAdmin):
+class FilmworkAdmin(IndexedSearchMixin, LargeTableAdmin):
     inlines = (
         PersonFilmworkInline,
         GenreFilmworkInline,
     )
 
+    # Порядок списка и ключ перехода на следующую страницу без OFFSET
+    ordering = ('creation_date', 'id')
+    keyset = ('creation_date', 'id')
+
     # Отображение полей в списке
-    list_display = ('title', 'type', 'creation_date', 'show_rating',)
+    list_display = ('title', 'type', 'creation_date', 'show_rating', 'show_genres', 'show_persons',)
 
-    # Фильтрация в списке
+    # Фильтрация в списке; варианты обоих фильтров — choices поля и готовые периоды дат,
+    # они строятся без запросов к базе, поэтому не кэшируются
     list_filter = ('type', 'creation_date')
 
-    # Поиск по полям
+    # Поиск по полям: полнотекстовый по названию и описанию, нечёткий по названию, точный по id
     search_fields = ('title', 'description', 'id')
 
+    # Выгрузка выбранных фильмов; «выбрать все» выгружает весь отфильтрованный список
+    actions = ('export_csv', 'export_jsonl')
+
+    def get_queryset(self, request):
+        # жанры и участники приходят в той же выборке, что и страница списка
+        return super().get_queryset(request).annotate(
+            genre_names=names_subquery(GenreFilmwork, 'genre__name'),
+            person_names=names_subquery(PersonFilmwork, 'person__full_name'),
+        )
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def export_response(self, queryset, export_format):
+        response = StreamingHttpResponse(export_chunks(queryset, export_format), content_type=FORMATS[export_format])
+        response['Content-Disposition'] = f'attachment; filename="filmworks.{export_format}"'
+        return response
+
+    @admin.action(description=_('export selected to CSV'), permissions=('view',))
+    def export_csv(self, request, queryset):
+        return self.export_response(queryset, 'csv')
+
+    @admin.action(description=_('export selected to JSON Lines'), permissions=('view',))
+    def export_jsonl(self, request, queryset):
+        return self.export_response(queryset, 'jsonl')
+
+    def search_filter(self, term):
+        query = SearchQuery(term, config=SEARCH_CONFIG, search_type='websearch')
+        return Q(search_vector=query) | Q(title__trigram_word_similar=term)
+
+    @admin.display(description=_('genres'))
+    def show_genres(self, obj):
+        return ', '.join(obj.genre_names or ())
+
+    @admin.display(description=_('persons'))
+    def show_persons(self, obj):
+        return ', '.join(obj.person_names or ())
+
 
 @admin.register(Genre)
-class GenreAdmin(admin.ModelAdmin):
-    pass
+class GenreAdmin(IndexedSearchMixin, LargeTableAdmin):
+    search_fields = ('name',)
+
+    def search_filter(self, term):
+        return Q(name__iprefix=term) | Q(name__trigram_word_similar=term)
 
 
 @admin.register(Person)
-class PersonAdmin(admin.ModelAdmin):
-    pass
+class PersonAdmin(IndexedSearchMixin, LargeTableAdmin):
+    search_fields = ('full_name',)
+
+    def search_filter(self, term):
+        # начало имени и нечёткое совпадение слова — оба условия по GIN-индексу person_full_name_trgm_idx
+        return Q(full_name__iprefix=term) | Q(full_name__trigram_word_similar=term)
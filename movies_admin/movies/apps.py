@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.contrib.admin.apps import AdminConfig
 from django.utils.translation import gettext_lazy as _
 
 
@@ -6,3 +7,16 @@ class MoviesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'movies'
     verbose_name = _('movies')
+
+    def ready(self):
+        from django.core.signals import request_started
+
+        from . import lookups  # noqa: F401
+        from . import signals
+        from .db import check_connections
+        signals.connect()
+        request_started.connect(check_connections, dispatch_uid='check_connections')
+
+
+class MoviesAdminConfig(AdminConfig):
+    default_site = 'movies.sites.MoviesAdminSite'
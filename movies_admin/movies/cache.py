@@ -0,0 +1,52 @@
+"""Кэш админки с версионированными ключами.
+
+Данные кэшируются под ключом, в который входят текущие версии пространств
+имён, от которых они зависят: 'person' — все персоны, 'filmwork:<id>' —
+один фильм и его связи. Сигналы после записи модели увеличивают версии
+(см. signals.py), и старые ключи больше не читаются, а истекают сами.
+bulk_create, update() и сырой SQL сигналов не отправляют: после них нужен
+bump() нужных пространств имён или cache.clear().
+"""
+import time
+
+from django.core.cache import cache
+
+_MISSING = object()
+
+
+def _version_key(namespace):
+    return f'version:{namespace}'
+
+
+def _new_version():
+    # версия из времени, а не счётчик с единицы: если ключ версии вытеснен из кэша,
+    # новая версия не совпадёт ни с одной из тех, под которыми лежат старые данные
+    return time.time_ns()
+
+
+def versions(namespaces):
+    keys = [_version_key(namespace) for namespace in namespaces]
+    found = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def bump(*namespaces):
+    """Делает недействительным всё, что закэшировано с этими пространствами имён"""
+    cache.set_many({_version_key(namespace): _new_version() for namespace in namespaces}, None)
+
+
+def cached(namespaces, key, compute, timeout=None):
+    """Значение compute() под key, пока не изменилась ни одна версия namespaces"""
+    versioned = ':'.join([key, *map(str, versions(namespaces))])
+    value = cache.get(versioned, _MISSING)
+    if value is _MISSING:
+        value = compute()
+        if timeout is None:
+            cache.set(versioned, value)
+        else:
+            cache.set(versioned, value, timeout)
+    return value
@@ -0,0 +1,31 @@
+"""Соединения с базой: проверка переиспользуемых соединений и чтение больших выборок.
+
+В Django 3.2 нет настройки CONN_HEALTH_CHECKS (она появилась в 4.1), поэтому
+её выполняет check_connections по сигналу request_started: соединение,
+оставшееся от прошлого запроса, проверяется до первого запроса к базе и
+закрывается, если сервер его уже разорвал (перезапуск Postgres, пулер,
+idle-таймаут). Без проверки такой запрос завершился бы ошибкой.
+"""
+from django.db import connections, transaction
+
+# Строк, которые именованный курсор передаёт за один FETCH
+CHUNK_SIZE = 2000
+
+
+def check_connections(**kwargs):
+    for connection in connections.all():
+        if connection.settings_dict.get('CONN_HEALTH_CHECKS') and connection.connection is not None:
+            if connection.in_atomic_block or connection.is_usable():
+                continue
+            connection.close()
+
+
+def stream(queryset, chunk_size=CHUNK_SIZE):
+    """Строки queryset порциями по chunk_size через именованный (серверный) курсор.
+
+    Курсор открывается в транзакции: за пулером в режиме transaction он иначе
+    пропадёт вместе с серверным соединением после первого FETCH. Кэш
+    результатов QuerySet не заполняется, память не растёт с размером выборки.
+    """
+    with transaction.atomic(using=queryset.db):
+        yield from queryset.iterator(chunk_size=chunk_size)
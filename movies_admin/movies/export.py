@@ -0,0 +1,72 @@
+"""Выгрузка фильмов с жанрами и участниками в CSV и JSON Lines.
+
+Жанры и участники собираются в массивы подзапросами в том же SELECT, строки
+читаются именованным курсором порциями (movies.db.stream) и сразу
+превращаются в текст, поэтому память не зависит от размера выгрузки.
+"""
+import csv
+import json
+
+from .db import CHUNK_SIZE, stream
+from .models import GenreFilmwork, PersonFilmwork
+from .queries import names_subquery
+
+FIELDS = ('id', 'title', 'type', 'creation_date', 'rating', 'description', 'genres', 'persons')
+
+# Форматы выгрузки (они же расширения файлов) и их типы содержимого
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+# Строк в одном куске ответа: по строке на кусок WSGI-сервер тратит больше, чем на сами данные
+LINES_PER_CHUNK = 500
+
+# Разделитель имён жанров и участников в ячейке CSV
+CSV_LIST_SEPARATOR = ', '
+
+
+def export_rows(queryset, chunk_size=CHUNK_SIZE):
+    """Словари с полями FIELDS по строкам queryset в его порядке"""
+    rows = queryset.annotate(
+        export_genres=names_subquery(GenreFilmwork, 'genre__name'),
+        export_persons=names_subquery(PersonFilmwork, 'person__full_name'),
+    ).values_list(*FIELDS[:-2], 'export_genres', 'export_persons')
+    for row in stream(rows, chunk_size):
+        yield dict(zip(FIELDS, row))
+
+
+class _Line:
+    """Файлоподобный объект для csv.writer: write возвращает строку, а не пишет её"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        yield writer.writerow([
+            CSV_LIST_SEPARATOR.join(value or ()) if name in ('genres', 'persons') else value
+            for name, value in row.items()
+        ])
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        row['genres'], row['persons'] = row['genres'] or [], row['persons'] or []
+        yield json.dumps(row, ensure_ascii=False, default=str) + '\n'
+
+
+def export_chunks(queryset, export_format, chunk_size=CHUNK_SIZE):
+    """Текст выгрузки кусками по LINES_PER_CHUNK строк"""
+    lines = {'csv': csv_lines, 'jsonl': jsonl_lines}[export_format](export_rows(queryset, chunk_size))
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == LINES_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
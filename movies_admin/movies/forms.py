@@ -0,0 +1,13 @@
+from django import forms
+from django.utils.translation import gettext_lazy as _
+
+from .importer import MODELS, READERS
+
+
+class ImportForm(forms.Form):
+    model = forms.ChoiceField(
+        label=_('table'),
+        choices=[(name, model._meta.db_table.rpartition('"')[2]) for name, model in MODELS.items()],
+    )
+    file = forms.FileField(label=_('file'))
+    format = forms.ChoiceField(label=_('format'), choices=[(name, name.upper()) for name in READERS])
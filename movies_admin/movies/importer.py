@@ -0,0 +1,312 @@
+"""Массовый импорт фильмов, жанров, персон и их связей из CSV и JSON Lines.
+
+Строки файла читаются по одной и проверяются по полям модели (clean_fields:
+типы, choices, валидаторы rating). Прошедшие проверку строки порциями уходят
+через COPY во временную таблицу, где SQL находит то, что построчно проверять
+дорого: повторы id и уникальных пар внутри файла, ссылки на несуществующие
+записи и связи с id, уже занятым связью с другими значениями. Такие строки отбрасываются с ошибкой, остальные переносятся в таблицу
+модели одним INSERT ... SELECT в той же транзакции. Ошибка в строке не
+прерывает импорт файла.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import ForeignKey, UniqueConstraint
+from django.utils import timezone
+
+from .cache import bump
+from .db import CHUNK_SIZE
+from .models import Filmwork, Genre, GenreFilmwork, Person, PersonFilmwork
+
+# Модели по model_name в порядке, в котором загружаются их файлы: связи — после фильмов, жанров и персон
+MODELS = {model._meta.model_name: model for model in (Genre, Person, Filmwork, GenreFilmwork, PersonFilmwork)}
+
+# Сколько ошибок хранится в отчёте; остальные только считаются
+MAX_ERRORS = 1000
+
+
+class ImportFileError(Exception):
+    """Файл нельзя импортировать: он пуст или в нём нет ни одной колонки модели"""
+
+
+@dataclass
+class ImportReport:
+    model: str
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    # строки, которые уже есть в таблице без изменений
+    skipped: int = 0
+    error_count: int = 0
+    # (номер строки файла, сообщение), не больше MAX_ERRORS
+    errors: list = field(default_factory=list)
+    # колонки и ключи файла, которых нет в модели
+    ignored: set = field(default_factory=set)
+
+    def error(self, row, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((row, message))
+
+    @property
+    def ignored_columns(self):
+        return sorted(self.ignored)
+
+    def __str__(self):
+        line = (f'{self.model}: {self.rows} rows, {self.inserted} inserted, {self.updated} updated, '
+                f'{self.skipped} unchanged, {self.error_count} rejected')
+        if self.ignored:
+            line += f'\n  ignored columns: {", ".join(self.ignored_columns)}'
+        for row, message in self.errors:
+            line += f'\n  row {row}: {message}'
+        if self.error_count > len(self.errors):
+            line += f'\n  ... {self.error_count - len(self.errors)} more'
+        return line
+
+
+def import_fields(model):
+    """Поля, значения которых берутся из файла: первичный ключ и редактируемые поля"""
+    return [f for f in model._meta.concrete_fields if f.primary_key or f.editable]
+
+
+def auto_fields(model):
+    """Поля auto_now и auto_now_add, которые при импорте получают текущее время"""
+    return [
+        f for f in model._meta.concrete_fields
+        if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)
+    ]
+
+
+def copy_value(value) -> str:
+    """Представление значения в текстовом формате COPY"""
+    if value is None:
+        return '\\N'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+def read_csv(file, report, names):
+    reader = csv.DictReader(file)
+    if reader.fieldnames is None:
+        raise ImportFileError('Файл пуст')
+    if not names & set(reader.fieldnames):
+        raise ImportFileError(f'В заголовке нет ни одной колонки из: {", ".join(sorted(names))}')
+    report.ignored.update(set(reader.fieldnames) - names)
+    for record in reader:
+        # line_num — последняя строка записи: значение в кавычках может занимать несколько строк
+        yield reader.line_num, record
+
+
+def read_jsonl(file, report, names):
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            report.rows += 1
+            report.error(number, f'JSON: {error}')
+            continue
+        if not isinstance(record, dict):
+            report.rows += 1
+            report.error(number, 'JSON: ожидается объект')
+            continue
+        report.ignored.update(record.keys() - names)
+        yield number, record
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+class Importer:
+    """Импорт одного файла в таблицу model через временную таблицу import_<model_name>"""
+
+    def __init__(self, model, chunk_size=CHUNK_SIZE):
+        self.model = model
+        self.chunk_size = chunk_size
+        self.fields = import_fields(model)
+        self.foreign_keys = [f for f in self.fields if isinstance(f, ForeignKey)]
+        self.auto_fields = auto_fields(model)
+        self.columns = [f.column for f in (*self.fields, *self.auto_fields)]
+        self.report = ImportReport(model._meta.model_name)
+        quote = connection.ops.quote_name
+        self.table = quote(model._meta.db_table)
+        self.staging = quote(f'import_{model._meta.model_name}')
+
+    def clean(self, record):
+        """Значения полей self.fields по записи файла; ValidationError со всеми ошибками строки"""
+        values, errors = {}, {}
+        for f in self.fields:
+            value = record.get(f.attname, record.get(f.name))
+            # в CSV нет NULL: пустая ячейка — значение по умолчанию или NULL, если поле его допускает
+            if value is None or value == '':
+                if f.has_default():
+                    continue
+                value = None if value is None or f.null else value
+            values[f.attname] = value
+
+        # внешние ключи проверяются одним запросом по временной таблице, а не запросом на строку
+        for f in self.foreign_keys:
+            try:
+                if values[f.attname] is None:
+                    raise ValidationError(f.error_messages['null'], code='null')
+                values[f.attname] = f.target_field.to_python(values[f.attname])
+            except ValidationError as error:
+                errors[f.name] = error.messages
+
+        instance = self.model(**values)
+        checked = {f.name for f in self.fields} - {f.name for f in self.foreign_keys}
+        try:
+            instance.clean_fields(exclude=[f.name for f in self.model._meta.fields if f.name not in checked])
+        except ValidationError as error:
+            errors.update(error.message_dict)
+        if errors:
+            raise ValidationError(errors)
+        return [getattr(instance, f.attname) for f in self.fields]
+
+    def stage(self, cursor, records):
+        """Проверенные строки порциями по chunk_size уходят COPY во временную таблицу"""
+        cursor.execute(f'CREATE TEMP TABLE {self.staging} (LIKE {self.table} INCLUDING DEFAULTS);')
+        cursor.execute(f'ALTER TABLE {self.staging} ADD COLUMN import_row bigint;')
+        copy = f'COPY {self.staging} ({", ".join(self.columns)}, import_row) FROM STDIN;'
+        now = [timezone.now()] * len(self.auto_fields)
+
+        buffer, buffered = io.StringIO(), 0
+        for number, record in records:
+            self.report.rows += 1
+            try:
+                row = self.clean(record)
+            except ValidationError as error:
+                self.report.error(number, '; '.join(
+                    f'{name}: {" ".join(messages)}' for name, messages in error.message_dict.items()
+                ))
+                continue
+            buffer.write('\t'.join(copy_value(value) for value in (*row, *now, number)))
+            buffer.write('\n')
+            buffered += 1
+            if buffered == self.chunk_size:
+                buffer.seek(0)
+                cursor.copy_expert(copy, buffer)
+                buffer, buffered = io.StringIO(), 0
+        if buffered:
+            buffer.seek(0)
+            cursor.copy_expert(copy, buffer)
+
+    def reject(self, cursor, condition, column, message):
+        """Удаляет из временной таблицы строки по condition с ошибкой message.format(значение column)"""
+        cursor.execute(f'DELETE FROM {self.staging} s WHERE {condition} RETURNING import_row, {column};')
+        for number, value in cursor.fetchall():
+            self.report.error(number, message.format(value))
+
+    def check(self, cursor):
+        """Отбрасывает строки, которые нарушили бы ключи и ограничения таблицы"""
+        opts = self.model._meta
+        unique = [(opts.pk,)]
+        unique += [tuple(opts.get_field(name) for name in fields) for fields in opts.unique_together]
+        unique += [tuple(opts.get_field(name) for name in constraint.fields)
+                   for constraint in opts.constraints if isinstance(constraint, UniqueConstraint)]
+        for fields in unique:
+            key = ', '.join(f.column for f in fields)
+            # в уникальном индексе Postgres NULL не равен NULL, а PARTITION BY их объединяет:
+            # строки с NULL в ключе не повторяют ни друг друга, ни записи таблицы
+            not_null = ' AND '.join(f'{f.column} IS NOT NULL' for f in fields if f.null) or 'TRUE'
+            self.reject(cursor, f"""import_row IN (
+                SELECT import_row FROM (
+                    SELECT import_row, row_number() OVER (PARTITION BY {key} ORDER BY import_row) AS n
+                    FROM {self.staging} WHERE {not_null}
+                ) AS numbered WHERE n > 1
+            )""", f'({key})', f'({key}) {{}} повторяет предыдущую строку')
+
+        for f in self.foreign_keys:
+            parent = connection.ops.quote_name(f.related_model._meta.db_table)
+            self.reject(
+                cursor, f'NOT EXISTS (SELECT 1 FROM {parent} p WHERE p.{f.target_field.column} = s.{f.column})',
+                f.column, f'{f.name}: нет записи {{}}',
+            )
+
+        if opts.unique_together or opts.constraints:
+            # связи вставляются с ON CONFLICT DO NOTHING, и занятый id с другими значениями
+            # пропускался бы молча, как уже существующая связь
+            pk = opts.pk.column
+            compared = [f.column for f in self.fields if not f.primary_key]
+            self.reject(cursor, f"""EXISTS (
+                SELECT 1 FROM {self.table} t WHERE t.{pk} = s.{pk}
+                AND ({", ".join(f"t.{c}" for c in compared)}) IS DISTINCT FROM ({", ".join(f"s.{c}" for c in compared)})
+            )""", pk, f'{pk} {{}} уже занят связью с другими значениями')
+
+    def merge(self, cursor):
+        """Переносит строки временной таблицы в таблицу модели одним INSERT ... SELECT.
+
+        Существующие строки сущностей обновляются, если значения отличаются;
+        у связей есть уникальная пара, и уже существующие связи пропускаются.
+        """
+        column_names = ', '.join(self.columns)
+        pk = self.model._meta.pk.column
+        fixed = {pk, *(f.column for f in self.auto_fields if f.auto_now_add)}
+        changed = [column for column in self.columns if column not in fixed]
+        compared = [f.column for f in self.fields if f.column not in fixed]
+
+        if self.model._meta.unique_together or self.model._meta.constraints:
+            on_conflict = 'ON CONFLICT DO NOTHING'
+        else:
+            on_conflict = (
+                f'ON CONFLICT ({pk}) DO UPDATE SET {", ".join(f"{c} = EXCLUDED.{c}" for c in changed)} '
+                f'WHERE ({", ".join(f"target.{c}" for c in compared)}) '
+                f'IS DISTINCT FROM ({", ".join(f"EXCLUDED.{c}" for c in compared)})'
+            )
+        # xmax = 0 только у только что вставленной строки; RETURNING считается в запросе, а не в Python
+        cursor.execute(f"""
+            WITH merged AS (
+                INSERT INTO {self.table} AS target ({column_names})
+                SELECT {column_names} FROM {self.staging} ORDER BY import_row
+                {on_conflict}
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted),
+                   (SELECT COUNT(*) FROM {self.staging})
+            FROM merged;
+        """)
+        self.report.inserted, self.report.updated, staged = cursor.fetchone()
+        self.report.skipped = staged - self.report.inserted - self.report.updated
+
+    def namespaces(self, cursor):
+        """Пространства имён кэша, которые затронул импорт (как у signals.namespaces)"""
+        namespaces = [self.model._meta.model_name]
+        for f in self.foreign_keys:
+            cursor.execute(f'SELECT DISTINCT {f.column} FROM {self.staging};')
+            namespaces += [f'{f.related_model._meta.model_name}:{value}' for (value,) in cursor.fetchall()]
+        return namespaces
+
+    def run(self, file, file_format):
+        names = {name for f in self.fields for name in (f.name, f.attname)}
+        records = READERS[file_format](file, self.report, names)
+        with transaction.atomic(), connection.cursor() as cursor:
+            self.stage(cursor, records)
+            self.check(cursor)
+            self.merge(cursor)
+            namespaces = self.namespaces(cursor)
+            # временная таблица удаляется сразу: импорт может идти во внешней транзакции
+            cursor.execute(f'DROP TABLE {self.staging};')
+            # COPY и INSERT ... SELECT не отправляют post_save, поэтому кэш сбрасывается здесь
+            transaction.on_commit(lambda: bump(*namespaces))
+        self.report.errors.sort()
+        return self.report
+
+
+def import_file(model, file, file_format, chunk_size=CHUNK_SIZE):
+    """Импортирует текстовый файл file в формате file_format ('csv' или 'jsonl') в таблицу model"""
+    return Importer(model, chunk_size).run(file, file_format)
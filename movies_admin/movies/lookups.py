@@ -0,0 +1,28 @@
+from django.db.models import CharField
+from django.db.models.lookups import Lookup, PostgresOperatorLookup
+
+
+@CharField.register_lookup
+class TrigramWordSimilar(PostgresOperatorLookup):
+    """Значение поля содержит слово, похожее на искомое (оператор %> из pg_trgm).
+
+    В отличие от trigram_similar сравнивает искомое с отдельными словами, а не со
+    всей строкой, поэтому подходит для поиска по части названия или имени.
+    Использует GIN-индекс с gin_trgm_ops.
+    """
+    lookup_name = 'trigram_word_similar'
+    postgres_operator = '%%>'
+
+
+@CharField.register_lookup
+class InsensitivePrefix(Lookup):
+    """ILIKE 'term%' без UPPER(), который добавляет istartswith.
+
+    Такое условие может использовать GIN-индекс с gin_trgm_ops.
+    """
+    lookup_name = 'iprefix'
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        return f'{lhs} ILIKE %s', [*lhs_params, f'{connection.ops.prep_for_like_query(self.rhs)}%']
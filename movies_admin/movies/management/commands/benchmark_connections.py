@@ -0,0 +1,91 @@
+import statistics
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает задержку запросов к админке с новым соединением на каждый запрос и с переиспользованием'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='сотрудник, от имени которого открываются страницы')
+        parser.add_argument('--url', default=None, help='страница (по умолчанию — список фильмов)')
+        parser.add_argument('--requests', type=int, default=200, help='запросов в каждом режиме')
+        parser.add_argument('--max-age', type=int, default=60, help='CONN_MAX_AGE в режимах с переиспользованием')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'], is_staff=True)
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'Нет сотрудника {options["username"]}')
+        url = options['url'] or reverse('admin:movies_filmwork_changelist')
+
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        cookie = f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+        connection = connections[DEFAULT_DB_ALIAS]
+        original = {key: connection.settings_dict.get(key) for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+        modes = (
+            ('new connection per request', 0, False),
+            (f'CONN_MAX_AGE={options["max_age"]}', options['max_age'], False),
+            (f'CONN_MAX_AGE={options["max_age"]} + health checks', options['max_age'], True),
+        )
+        # тестовый клиент не закрывает соединения между запросами, поэтому запросы идут через WSGIHandler
+        setup_test_environment()
+        try:
+            handler = WSGIHandler()
+            # первый запрос заполняет кэш админки и не должен попасть ни в один из режимов
+            self.run(handler, url, cookie, 1)
+            for name, max_age, health_checks in modes:
+                connection.close()
+                connection.settings_dict.update(CONN_MAX_AGE=max_age, CONN_HEALTH_CHECKS=health_checks)
+                latencies, opened = self.run(handler, url, cookie, options['requests'])
+                self.report(name, latencies, opened)
+        finally:
+            teardown_test_environment()
+            connection.close()
+            connection.settings_dict.update(original)
+            session.delete()
+
+    def run(self, handler, url, cookie, count):
+        opened = []
+
+        def created(**kwargs):
+            opened.append(kwargs['connection'].alias)
+
+        latencies = []
+        connection_created.connect(created)
+        try:
+            for _ in range(count):
+                environ = RequestFactory().get(url, HTTP_COOKIE=cookie).environ
+                started = time.perf_counter()
+                response = handler(environ, lambda status, headers: None)
+                b''.join(response)
+                # WSGI-сервер закрывает ответ, и request_finished закрывает или оставляет соединение
+                response.close()
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f'{url}: HTTP {response.status_code}')
+        finally:
+            connection_created.disconnect(created)
+        return latencies, len(opened)
+
+    def report(self, name, latencies, opened):
+        p50, p95 = (statistics.quantiles(latencies, n=100)[n - 1] * 1000 for n in (50, 95))
+        self.stdout.write(
+            f'{name}: mean {statistics.mean(latencies) * 1000:.1f} ms, p50 {p50:.1f} ms, p95 {p95:.1f} ms, '
+            f'{opened} connections for {len(latencies)} requests'
+        )
@@ -0,0 +1,56 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+# Источники строки фильма с жанрами и участниками (миграция 0009_film_work_read)
+SOURCES = (
+    ('live joins', 'content.film_work_live'),
+    ('materialized view', 'content.film_work_read'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает задержку чтения фильмов с жанрами и участниками из film_work_read и через соединения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=200, help='чтений каждого вида из каждого источника')
+        parser.add_argument('--page', type=int, default=50, help='фильмов на странице списка')
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT id, creation_date FROM content.film_work_read ORDER BY random() LIMIT %s;',
+                           (options['samples'],))
+            keys = cursor.fetchall()
+            if not keys:
+                raise CommandError('film_work_read пуст: выполните refresh_read_model')
+
+            reads = (
+                ('by id', 'WHERE id = %s', lambda key: (key[0],)),
+                (f'page of {options["page"]}',
+                 f'WHERE (creation_date, id) > (%s, %s) ORDER BY creation_date, id LIMIT {options["page"]}',
+                 lambda key: (key[1], key[0])),
+            )
+            for read, condition, params in reads:
+                for source, view in SOURCES:
+                    # первое чтение прогревает кэш страниц и не учитывается
+                    latencies = self.measure(cursor, f'SELECT * FROM {view} {condition};', [keys[0], *keys], params)[1:]
+                    self.report(f'{source}, {read}', latencies)
+
+    @staticmethod
+    def measure(cursor, sql, keys, params):
+        latencies = []
+        for key in keys:
+            started = time.perf_counter()
+            cursor.execute(sql, params(key))
+            cursor.fetchall()
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    def report(self, name, latencies):
+        p50, p95 = (statistics.quantiles(latencies, n=100)[n - 1] * 1000 for n in (50, 95))
+        self.stdout.write(
+            f'{name}: mean {statistics.mean(latencies) * 1000:.2f} ms, p50 {p50:.2f} ms, p95 {p95:.2f} ms, '
+            f'{len(latencies)} reads'
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from movies.query_plans import check_admin_plans
+
+
+class Command(BaseCommand):
+    help = 'Проверяет, что запросы страниц админки не читают большие таблицы последовательно'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=10000,
+                            help='таблицы меньше этого числа строк можно читать последовательно')
+
+    def handle(self, *args, **options):
+        # тестовый клиент обращается к серверу testserver, которого нет в ALLOWED_HOSTS
+        setup_test_environment()
+        try:
+            problems = check_admin_plans(options['min_rows'])
+        finally:
+            teardown_test_environment()
+
+        for page, table, sql in problems:
+            self.stdout.write(f'{page}: Seq Scan on {table}\n  {sql}')
+        if problems:
+            raise CommandError(f'{len(problems)} queries read large tables sequentially')
+        self.stdout.write(self.style.SUCCESS('No sequential scans on large tables'))
@@ -0,0 +1,36 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from movies.db import CHUNK_SIZE
+from movies.export import FORMATS, export_chunks
+from movies.models import Filmwork
+
+
+class Command(BaseCommand):
+    help = 'Выгружает фильмы с жанрами и участниками в CSV или JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='csv', help='формат выгрузки')
+        parser.add_argument('--output', help='файл выгрузки (по умолчанию — stdout)')
+        parser.add_argument('--type', choices=Filmwork.FilmTypes.values, help='только фильмы этого типа')
+        parser.add_argument('--year', type=int, help='только фильмы этого года')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='строк за одно чтение из курсора')
+
+    def handle(self, *args, **options):
+        queryset = Filmwork.objects.order_by('creation_date', 'id')
+        if options['type']:
+            queryset = queryset.filter(type=options['type'])
+        if options['year']:
+            # диапазон дат, а не creation_date__year: условие идёт по индексу на creation_date
+            year = options['year']
+            queryset = queryset.filter(creation_date__gte=datetime.date(year, 1, 1),
+                                       creation_date__lt=datetime.date(year + 1, 1, 1))
+
+        chunks = export_chunks(queryset, options['format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
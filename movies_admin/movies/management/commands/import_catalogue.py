@@ -0,0 +1,32 @@
+import pathlib
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.db import CHUNK_SIZE
+from movies.importer import MODELS, READERS, ImportFileError, import_file
+
+
+class Command(BaseCommand):
+    help = 'Импортирует фильмы, жанры, персоны или их связи из CSV или JSON Lines через COPY'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=MODELS, help='таблица: связи загружаются после фильмов, жанров и персон')
+        parser.add_argument('path', help='файл импорта')
+        parser.add_argument('--format', choices=READERS, help='формат файла (по умолчанию — по расширению)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='строк в одном COPY')
+
+    def handle(self, *args, **options):
+        path = pathlib.Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат {path.suffix}: укажите --format')
+
+        with open(path, encoding='utf-8-sig', newline='') as file:
+            try:
+                report = import_file(MODELS[options['model']], file, file_format, options['chunk_size'])
+            except ImportFileError as error:
+                raise CommandError(error)
+
+        self.stdout.write(str(report))
+        if report.error_count:
+            raise CommandError(f'{report.error_count} rows rejected')
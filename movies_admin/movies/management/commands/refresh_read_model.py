@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies.models import FilmworkRead
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает материализованное представление content.film_work_read'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--blocking', action='store_true',
+                            help='без CONCURRENTLY: быстрее, но чтение представления ждёт конца пересчёта')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        FilmworkRead.refresh(concurrently=not options['blocking'])
+        self.stdout.write(self.style.SUCCESS(f'film_work_read refreshed in {time.perf_counter() - started:.1f}s'))
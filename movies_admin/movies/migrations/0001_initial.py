@@ -14,6 +14,8 @@ class Migration(migrations.Migration):
     ]
 
     operations = [
+        # таблицы живут в схеме content; в рабочей базе она уже есть, а тестовую создаёт миграция
+        migrations.RunSQL('CREATE SCHEMA IF NOT EXISTS content;', reverse_sql=migrations.RunSQL.noop),
         migrations.CreateModel(
             name='Filmwork',
             fields=[
@@ -0,0 +1,123 @@
+# Generated by Django 3.2 on 2026-10-18 19:58
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# search_vector пересчитывается триггером при любой записи, в том числе в обход Django (load_data.py)
+SEARCH_TRIGGER = """
+CREATE OR REPLACE FUNCTION content.film_work_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER film_work_search_vector_update
+    BEFORE INSERT OR UPDATE OF title, description ON content.film_work
+    FOR EACH ROW EXECUTE FUNCTION content.film_work_search_vector();
+"""
+
+DROP_SEARCH_TRIGGER = """
+DROP TRIGGER IF EXISTS film_work_search_vector_update ON content.film_work;
+DROP FUNCTION IF EXISTS content.film_work_search_vector();
+"""
+
+# Строк в одной транзакции заполнения search_vector: таблица не переписывается одним UPDATE
+BACKFILL_BATCH = 5000
+
+
+def backfill_search_vector(apps, schema_editor):
+    """Заполняет search_vector существующих фильмов пачками по диапазонам id.
+
+    Миграция не атомарная, поэтому каждая пачка фиксируется отдельно;
+    значение считает триггер на UPDATE OF title.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        last_id = None
+        while True:
+            cursor.execute("""
+                SELECT id FROM (
+                    SELECT id FROM content.film_work
+                    WHERE %s::uuid IS NULL OR id > %s::uuid
+                    ORDER BY id LIMIT %s
+                ) AS batch
+                ORDER BY id DESC LIMIT 1;
+            """, (last_id, last_id, BACKFILL_BATCH))
+            row = cursor.fetchone()
+            if row is None:
+                break
+            cursor.execute("""
+                UPDATE content.film_work SET title = title
+                WHERE (%s::uuid IS NULL OR id > %s::uuid) AND id <= %s::uuid;
+            """, (last_id, last_id, row[0]))
+            last_id = row[0]
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции, а заполнение
+    # search_vector фиксируется пачками
+    atomic = False
+
+    dependencies = [
+        ('movies', '0005_alter_filmwork_rating'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='filmwork',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_TRIGGER, reverse_sql=DROP_SEARCH_TRIGGER),
+        migrations.RunPython(backfill_search_vector, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'CREATE INDEX CONCURRENTLY film_work_search_idx ON content.film_work USING gin (search_vector);',
+                    reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS content.film_work_search_idx;',
+                ),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='filmwork',
+                    index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='film_work_search_idx'),
+                ),
+            ],
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'CREATE INDEX CONCURRENTLY film_work_title_trgm_idx '
+                    'ON content.film_work USING gin (title gin_trgm_ops);',
+                    reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS content.film_work_title_trgm_idx;',
+                ),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='filmwork',
+                    index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='film_work_title_trgm_idx', opclasses=['gin_trgm_ops']),
+                ),
+            ],
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'CREATE INDEX CONCURRENTLY person_full_name_trgm_idx '
+                    'ON content.person USING gin (full_name gin_trgm_ops);',
+                    reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS content.person_full_name_trgm_idx;',
+                ),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='person',
+                    index=django.contrib.postgres.indexes.GinIndex(fields=['full_name'], name='person_full_name_trgm_idx', opclasses=['gin_trgm_ops']),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,74 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('movies', '0006_search'),
+    ]
+
+    operations = [
+        # film_work_creation_date_idx и person_film_work_idx объявлены в schema_design/create_movies_DB.DDL:
+        # миграция создаёт их, только если базу создавали не из DDL, и при откате не удаляет
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'CREATE INDEX CONCURRENTLY IF NOT EXISTS film_work_creation_date_idx '
+                    'ON content.film_work (creation_date, rating);',
+                    reverse_sql=migrations.RunSQL.noop,
+                ),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='filmwork',
+                    index=models.Index(fields=['creation_date', 'rating'], name='film_work_creation_date_idx'),
+                ),
+            ],
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'CREATE INDEX CONCURRENTLY film_work_type_idx ON content.film_work (type, creation_date);',
+                    reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS content.film_work_type_idx;',
+                ),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='filmwork',
+                    index=models.Index(fields=['type', 'creation_date'], name='film_work_type_idx'),
+                ),
+            ],
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'CREATE INDEX CONCURRENTLY film_work_rating_idx ON content.film_work (rating);',
+                    reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS content.film_work_rating_idx;',
+                ),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='filmwork',
+                    index=models.Index(fields=['rating'], name='film_work_rating_idx'),
+                ),
+            ],
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'CREATE INDEX CONCURRENTLY IF NOT EXISTS person_film_work_idx '
+                    'ON content.person_film_work (person_id, film_work_id);',
+                    reverse_sql=migrations.RunSQL.noop,
+                ),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='personfilmwork',
+                    index=models.Index(fields=['person', 'film_work'], name='person_film_work_idx'),
+                ),
+            ],
+        ),
+    ]
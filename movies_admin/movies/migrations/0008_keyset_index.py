@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('movies', '0007_admin_indexes'),
+    ]
+
+    operations = [
+        # порядок списка фильмов в админке и постраничный переход по ключу
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'CREATE INDEX CONCURRENTLY film_work_creation_id_idx ON content.film_work (creation_date, id);',
+                    reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS content.film_work_creation_id_idx;',
+                ),
+            ],
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='filmwork',
+                    index=models.Index(fields=['creation_date', 'id'], name='film_work_creation_id_idx'),
+                ),
+            ],
+        ),
+    ]
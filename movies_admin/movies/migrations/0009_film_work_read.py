@@ -0,0 +1,72 @@
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+# Строка фильма с жанрами и участниками: film_work_live считается при каждом чтении,
+# film_work_read хранит результат и обновляется REFRESH MATERIALIZED VIEW CONCURRENTLY,
+# для которого нужен уникальный индекс по id
+READ_MODEL = """
+CREATE VIEW content.film_work_live AS
+SELECT
+    fw.id, fw.title, fw.description, fw.creation_date, fw.rating, fw.type, fw.created_at, fw.updated_at,
+    COALESCE((
+        SELECT array_agg(g.name ORDER BY g.name)
+        FROM content.genre_film_work gfw
+        JOIN content.genre g ON g.id = gfw.genre_id
+        WHERE gfw.film_work_id = fw.id
+    ), '{}') AS genres,
+    COALESCE((
+        SELECT jsonb_object_agg(roles.role, roles.persons)
+        FROM (
+            SELECT
+                COALESCE(pfw.role, '') AS role,
+                jsonb_agg(jsonb_build_object('id', p.id, 'full_name', p.full_name) ORDER BY p.full_name, p.id) AS persons
+            FROM content.person_film_work pfw
+            JOIN content.person p ON p.id = pfw.person_id
+            WHERE pfw.film_work_id = fw.id
+            GROUP BY COALESCE(pfw.role, '')
+        ) AS roles
+    ), '{}') AS persons
+FROM content.film_work fw;
+
+CREATE MATERIALIZED VIEW content.film_work_read AS SELECT * FROM content.film_work_live;
+
+CREATE UNIQUE INDEX film_work_read_id_idx ON content.film_work_read (id);
+CREATE INDEX film_work_read_creation_id_idx ON content.film_work_read (creation_date, id);
+"""
+
+DROP_READ_MODEL = """
+DROP MATERIALIZED VIEW IF EXISTS content.film_work_read;
+DROP VIEW IF EXISTS content.film_work_live;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0008_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL(READ_MODEL, reverse_sql=DROP_READ_MODEL),
+        migrations.CreateModel(
+            name='FilmworkRead',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=100, verbose_name='title')),
+                ('description', models.TextField(null=True, verbose_name='description')),
+                ('creation_date', models.DateField(null=True, verbose_name='creation_date')),
+                ('rating', models.FloatField(null=True, verbose_name='rating')),
+                ('type', models.CharField(choices=[('movie', 'Movie'), ('tv_show', 'Tv Show')], max_length=35, verbose_name='type')),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('genres', django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), size=None, verbose_name='genres')),
+                ('persons', models.JSONField(verbose_name='persons')),
+            ],
+            options={
+                'verbose_name': 'movie',
+                'verbose_name_plural': 'movies',
+                'db_table': 'content"."film_work_read',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,11 +1,17 @@
 import uuid
 
-from django.db import models
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connection, models
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 from django.contrib import admin
 
+# Конфигурация полнотекстового поиска: русские слова со стеммингом, латиница — английским стеммером
+SEARCH_CONFIG = 'russian'
+
 
 class TimeStampedMixin(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
@@ -39,7 +45,7 @@ class Filmwork(UUIDMixin, TimeStampedMixin):
     title = models.CharField(_('title'), max_length=100)
 
     # Для форматированного вывода рейтинга на экран (напр. округленного)
-    @admin.display(description=_('rating'))
+    @admin.display(description=_('rating'), ordering='rating')
     def show_rating(self):
         return self.rating
 
@@ -68,6 +74,9 @@ class Filmwork(UUIDMixin, TimeStampedMixin):
     genres = models.ManyToManyField('Genre', through='GenreFilmwork', verbose_name=_('genres'))
     persons = models.ManyToManyField('Person', through='PersonFilmwork', verbose_name=_('persons'))
 
+    # Название и описание для полнотекстового поиска, заполняется триггером в базе
+    search_vector = SearchVectorField(null=True, editable=False)
+
     def __str__(self):
         return self.title
 
@@ -75,6 +84,15 @@ class Filmwork(UUIDMixin, TimeStampedMixin):
         db_table = "content\".\"film_work"
         verbose_name = _('movie')
         verbose_name_plural = _('movies')
+        indexes = [
+            # фильтры и сортировка списка в админке
+            models.Index(fields=['creation_date', 'rating'], name='film_work_creation_date_idx'),
+            models.Index(fields=['type', 'creation_date'], name='film_work_type_idx'),
+            models.Index(fields=['rating'], name='film_work_rating_idx'),
+            models.Index(fields=['creation_date', 'id'], name='film_work_creation_id_idx'),
+            GinIndex(fields=['search_vector'], name='film_work_search_idx'),
+            GinIndex(fields=['title'], name='film_work_title_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
 
 
 class GenreFilmwork(UUIDMixin):
@@ -103,6 +121,9 @@ class Person(UUIDMixin, TimeStampedMixin):
         db_table = "content\".\"person"
         verbose_name = _('person')
         verbose_name_plural = _('persons')
+        indexes = [
+            GinIndex(fields=['full_name'], name='person_full_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
 
 
 class PersonFilmwork(UUIDMixin):
@@ -120,3 +141,45 @@ class PersonFilmwork(UUIDMixin):
         constraints = [
             models.UniqueConstraint(fields=['film_work', 'person', 'role'], name='unique_filmwork_person_role'),
         ]
+        indexes = [
+            models.Index(fields=['person', 'film_work'], name='person_film_work_idx'),
+        ]
+
+
+class FilmworkRead(models.Model):
+    """Фильм с жанрами и участниками одной строкой, только для чтения.
+
+    Материализованное представление content.film_work_read (миграция
+    0009_film_work_read) обновляется refresh(); те же строки без задержки,
+    но с соединениями на каждое чтение, — в представлении content.film_work_live.
+    """
+    id = models.UUIDField(primary_key=True)
+    title = models.CharField(_('title'), max_length=100)
+    description = models.TextField(_('description'), null=True)
+    creation_date = models.DateField(_('creation_date'), null=True)
+    rating = models.FloatField(_('rating'), null=True)
+    type = models.CharField(_('type'), max_length=35, choices=Filmwork.FilmTypes.choices)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    # названия жанров по алфавиту
+    genres = ArrayField(models.TextField(), verbose_name=_('genres'))
+    # участники по ролям: {"director": [{"id": ..., "full_name": ...}], ...}, роль NULL — ключ ""
+    persons = models.JSONField(_('persons'))
+
+    def __str__(self):
+        return self.title
+
+    @classmethod
+    def refresh(cls, concurrently=True):
+        """Пересчитывает представление; с concurrently чтение не блокируется на время пересчёта"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'REFRESH MATERIALIZED VIEW {"CONCURRENTLY " if concurrently else ""}'
+                f'{connection.ops.quote_name(cls._meta.db_table)};'
+            )
+
+    class Meta:
+        managed = False
+        db_table = "content\".\"film_work_read"
+        verbose_name = _('movie')
+        verbose_name_plural = _('movies')
@@ -0,0 +1,171 @@
+"""Постраничный вывод больших списков админки.
+
+EstimatedCountPaginator не считает COUNT(*) на больших выборках, а
+KeysetChangeList листает список по ключу (поле, id) вместо OFFSET, поэтому
+далёкая страница открывается так же быстро, как первая.
+"""
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from django.utils.functional import cached_property
+
+# Параметр строки запроса с ключом последней строки предыдущей страницы
+CURSOR_VAR = 'after'
+CURSOR_SEPARATOR = '~'
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator, который на больших выборках берёт число строк из статистики Postgres.
+
+    Без фильтров — pg_class.reltuples таблицы, с фильтрами — оценка строк
+    плана из EXPLAIN. Если оценка меньше threshold, строки считаются точно.
+    """
+    threshold = 10000
+    estimated = False
+
+    @cached_property
+    def count(self):
+        estimate = self.estimate()
+        if estimate < self.threshold:
+            return self.object_list.count()
+        self.estimated = True
+        return estimate
+
+    def estimate(self):
+        queryset = self.object_list.order_by()
+        connection = connections[queryset.db]
+        with connection.cursor() as cursor:
+            if not queryset.query.where:
+                # db_table — 'content"."film_work': в regclass имя передаётся в кавычках
+                cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass;',
+                               (connection.ops.quote_name(queryset.model._meta.db_table),))
+                [rows] = cursor.fetchone()
+                # -1: таблицу ещё не анализировали
+                return max(int(rows), 0)
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            [[plan]] = cursor.fetchall()
+            return plan[0]['Plan']['Plan Rows']
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # по оценке строк может оказаться меньше, чем есть, — страницы дальше оценённой не отсекаются
+            if self.estimated and int(number) >= 1:
+                return int(number)
+            raise
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if not self.estimated and top + self.orphans >= self.count:
+            top = self.count
+        return self._get_page(self.object_list[bottom:top], number, self)
+
+
+class KeysetChangeList(ChangeList):
+    """Список, следующая страница которого выбирается по ключу последней строки.
+
+    Ключ — model_admin.keyset, пара (поле, первичный ключ); поле может быть
+    NULL, такие строки идут в конце, как при ORDER BY поле, id в Postgres.
+    Ссылка next_url строится, когда список упорядочен по ключу; на странице
+    с параметром CURSOR_VAR список всегда упорядочен по ключу.
+    """
+
+    @property
+    def keyset(self):
+        return self.model_admin.keyset
+
+    def parse_cursor(self, raw):
+        if raw is None:
+            return None
+        value, separator, pk = raw.rpartition(CURSOR_SEPARATOR)
+        if not separator:
+            raise IncorrectLookupParameters(f'Некорректный {CURSOR_VAR}: {raw}')
+        field_name, pk_name = self.keyset
+        try:
+            return (
+                self.opts.get_field(field_name).to_python(value) if value else None,
+                self.opts.get_field(pk_name).to_python(pk),
+            )
+        except ValidationError as error:
+            raise IncorrectLookupParameters(error)
+
+    def get_queryset(self, request):
+        # вызывается из ChangeList.__init__ до сортировки и выборки строк
+        self.cursor = self.parse_cursor(request.GET.get(CURSOR_VAR))
+        return super().get_queryset(request)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # фильтры, сортировка и номера страниц начинают список сначала
+        return super().get_query_string(new_params, [*(remove or ()), CURSOR_VAR])
+
+    def get_ordering(self, request, queryset):
+        if self.cursor is not None:
+            return list(self.keyset)
+        # ChangeList дописывает к порядку админки порядок queryset, тот же самый: повторы убираются,
+        # иначе порядок не совпадёт с keyset и ссылки на следующую страницу не будет
+        return list(dict.fromkeys(super().get_ordering(request, queryset)))
+
+    def after(self, value, pk):
+        """Строки после ключа (value, pk); value=None — с начала строк с NULL"""
+        field_name, pk_name = self.keyset
+        if value is None:
+            lookups = {f'{field_name}__isnull': True}
+            if pk is not None:
+                lookups[f'{pk_name}__gt'] = pk
+            return self.queryset.filter(**lookups)
+
+        connection = connections[self.queryset.db]
+        table = connection.ops.quote_name(self.opts.db_table)
+        column, pk_column = (connection.ops.quote_name(self.opts.get_field(name).column) for name in self.keyset)
+        # сравнение пар строк целиком — условие индексного поиска по (поле, id)
+        seek = RawSQL(f'({table}.{column}, {table}.{pk_column}) > (%s, %s)', (value, pk),
+                      output_field=BooleanField())
+        return self.queryset.filter(seek)
+
+    def get_results(self, request):
+        if self.cursor is None:
+            super().get_results(request)
+            rows = list(self.result_list)
+            has_next = self.multi_page and not self.show_all and len(rows) == self.list_per_page
+        else:
+            self.get_keyset_results(request)
+            rows = self.result_list
+            has_next = self.has_next
+
+        self.next_url = None
+        if has_next and list(self.queryset.query.order_by) == list(self.keyset):
+            last = rows[-1]
+            value = getattr(last, self.keyset[0])
+            token = f'{"" if value is None else value}{CURSOR_SEPARATOR}{getattr(last, self.keyset[1])}'
+            self.next_url = self.get_query_string({CURSOR_VAR: token}, [PAGE_VAR])
+
+    def get_keyset_results(self, request):
+        value, pk = self.cursor
+        limit = self.list_per_page + 1
+        rows = list(self.after(value, pk)[:limit])
+        if value is not None and len(rows) < limit:
+            rows += self.after(None, None)[:limit - len(rows)]
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = paginator.count
+        self.show_full_result_count = self.model_admin.show_full_result_count
+        self.full_result_count = self.root_queryset.count() if self.show_full_result_count else None
+        self.show_admin_actions = True
+        self.has_next = len(rows) == limit
+        self.result_list = rows[:self.list_per_page]
+        self.can_show_all = False
+        self.multi_page = True
+        self.paginator = paginator
@@ -0,0 +1,17 @@
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import OuterRef, Subquery
+
+
+def names_subquery(model, field):
+    """Имена связанных записей фильма одним массивом, отсортированным по имени.
+
+    Подзапрос на каждую связь вместо JOIN обеих таблиц связей: иначе строки
+    жанров и персон перемножаются.
+    """
+    return Subquery(
+        model.objects
+        .filter(film_work=OuterRef('pk'))
+        .values('film_work')
+        .annotate(names=ArrayAgg(field, ordering=field))
+        .values('names')
+    )
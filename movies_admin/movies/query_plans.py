@@ -0,0 +1,100 @@
+"""Проверка планов запросов, которые выполняет админка.
+
+Страницы из ADMIN_PAGES открываются тестовым клиентом от имени временного
+суперпользователя, каждый выполненный SELECT разбирается через EXPLAIN, и
+последовательное чтение таблицы схемы content, в которой не меньше min_rows
+строк (по статистике pg_class), считается проблемой. Всё, что при этом
+записывается в базу, откатывается.
+"""
+import json
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+# Страницы админки: имя URL и параметры строки запроса
+ADMIN_PAGES = (
+    ('admin:movies_filmwork_changelist', {}),
+    ('admin:movies_filmwork_changelist', {'type__exact': 'movie'}),
+    ('admin:movies_filmwork_changelist', {'creation_date__gte': '2020-01-01', 'creation_date__lt': '2021-01-01'}),
+    ('admin:movies_filmwork_changelist', {'type__exact': 'movie', 'creation_date__gte': '2020-01-01'}),
+    # сортировка по колонке рейтинга (четвёртой в list_display)
+    ('admin:movies_filmwork_changelist', {'o': '-4'}),
+    ('admin:movies_filmwork_changelist', {'q': 'star'}),
+    # страница после ключа (creation_date, id)
+    ('admin:movies_filmwork_changelist', {'after': '2020-01-01~00000000-0000-0000-0000-000000000000'}),
+    ('admin:movies_person_changelist', {'q': 'lucas'}),
+    ('admin:autocomplete', {'app_label': 'movies', 'model_name': 'personfilmwork', 'field_name': 'person', 'term': 'luc'}),
+)
+
+# Страницы отдельных объектов, открываются для первой по id строки модели
+OBJECT_PAGES = (
+    ('admin:movies_filmwork_change', 'movies.Filmwork'),
+)
+
+SCHEMA = 'content'
+
+
+def admin_queries(pages=ADMIN_PAGES, object_pages=OBJECT_PAGES):
+    """(страница, SQL) всех SELECT, выполненных при открытии страниц"""
+    user = get_user_model().objects.create_superuser('query_plans', 'query_plans@example.com', None)
+    client = Client()
+    client.force_login(user)
+
+    urls = [(reverse(name), params) for name, params in pages]
+    for name, model in object_pages:
+        obj = apps.get_model(model).objects.order_by('pk').first()
+        if obj is not None:
+            urls.append((reverse(name, args=(obj.pk,)), {}))
+
+    queries = []
+    for url, params in urls:
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get(url, params)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} {params}: HTTP {response.status_code}')
+        page = f'{url}?{response.wsgi_request.GET.urlencode()}'
+        queries += [(page, query['sql']) for query in captured if query['sql'].lstrip().upper().startswith('SELECT')]
+    return queries
+
+
+def _plan_nodes(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from _plan_nodes(child)
+
+
+def seq_scans(sql, min_rows=10000):
+    """Таблицы схемы content, которые запрос читает последовательно"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (VERBOSE, FORMAT JSON) {sql}')
+        [[plan]] = cursor.fetchall()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        tables = []
+        for node in _plan_nodes(plan[0]['Plan']):
+            if node['Node Type'] != 'Seq Scan' or node.get('Schema') != SCHEMA:
+                continue
+            table = node['Relation Name']
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass;', (f'{SCHEMA}.{table}',))
+            [rows] = cursor.fetchone()
+            # -1: таблицу ещё не анализировали, размер неизвестен
+            if rows < 0 or rows >= min_rows:
+                tables.append(table)
+        return tables
+
+
+def check_admin_plans(min_rows=10000, pages=ADMIN_PAGES, object_pages=OBJECT_PAGES):
+    """[(страница, таблица, SQL)] для каждого последовательного чтения большой таблицы"""
+    with transaction.atomic():
+        problems = [
+            (page, table, sql)
+            for page, sql in admin_queries(pages, object_pages)
+            for table in seq_scans(sql, min_rows)
+        ]
+        transaction.set_rollback(True)
+    return problems
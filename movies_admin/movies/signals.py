@@ -0,0 +1,26 @@
+from django.db.models import ForeignKey
+from django.db.models.signals import post_delete, post_save
+
+from .cache import bump
+from .models import Filmwork, Genre, GenreFilmwork, Person, PersonFilmwork
+
+
+def namespaces(instance):
+    """Пространства имён кэша, которые затрагивает запись instance:
+    вся модель, сам объект и объекты, на которые он ссылается"""
+    opts = instance._meta
+    yield opts.model_name
+    yield f'{opts.model_name}:{instance.pk}'
+    for field in opts.concrete_fields:
+        if isinstance(field, ForeignKey):
+            yield f'{field.related_model._meta.model_name}:{getattr(instance, field.attname)}'
+
+
+def invalidate(sender, instance, **kwargs):
+    bump(*namespaces(instance))
+
+
+def connect():
+    for model in (Filmwork, Genre, Person, GenreFilmwork, PersonFilmwork):
+        post_save.connect(invalidate, sender=model, dispatch_uid=f'invalidate_{model._meta.model_name}')
+        post_delete.connect(invalidate, sender=model, dispatch_uid=f'invalidate_{model._meta.model_name}_delete')
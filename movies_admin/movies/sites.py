@@ -0,0 +1,17 @@
+from django.contrib import admin
+from django.urls import path
+
+from .views import CachedAutocompleteJsonView, ImportView
+
+
+class MoviesAdminSite(admin.AdminSite):
+    """Сайт админки с кэшированными ответами автодополнения и массовым импортом"""
+
+    def get_urls(self):
+        return [
+            path('movies/import/', self.admin_view(ImportView.as_view(admin_site=self)), name='movies_import'),
+            *super().get_urls(),
+        ]
+
+    def autocomplete_view(self, request):
+        return CachedAutocompleteJsonView.as_view(admin_site=self)(request)
@@ -0,0 +1,72 @@
+import hashlib
+import io
+
+from django.contrib.admin.views.autocomplete import AutocompleteJsonView
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.translation import gettext_lazy as _
+from django.views.generic import FormView
+
+from .cache import cached
+from .forms import ImportForm
+from .importer import MODELS, ImportFileError, import_file
+
+
+class CachedAutocompleteJsonView(AutocompleteJsonView):
+    """Ответы автодополнения админки с кэшем.
+
+    Права проверяются на каждый запрос, а страница результатов для одних и тех
+    же параметров (модель, поле, строка поиска, номер страницы) берётся из кэша
+    Django до изменения искомой модели; браузер перепроверяет ответ на каждый
+    запрос, чтобы не показывать удалённые или переименованные записи.
+    """
+
+    def get(self, request, *args, **kwargs):
+        self.term, self.model_admin, self.source_field, to_field_name = self.process_request(request)
+        if not self.has_perm(request):
+            raise PermissionDenied
+
+        params = sorted(request.GET.items())
+        key = 'autocomplete:' + hashlib.md5(repr(params).encode()).hexdigest()
+        content = cached(
+            (self.model_admin.model._meta.model_name,), key,
+            lambda: super(CachedAutocompleteJsonView, self).get(request, *args, **kwargs).content,
+        )
+        response = HttpResponse(content, content_type='application/json')
+        patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+        return response
+
+
+class ImportView(FormView):
+    """Загрузка файла CSV или JSON Lines в одну из таблиц каталога (movies.importer).
+
+    Нужны права на добавление и изменение записей таблицы. Строки с ошибками
+    не импортируются и перечисляются в отчёте вместе с номерами строк файла.
+    """
+    form_class = ImportForm
+    template_name = 'admin/movies/import.html'
+    admin_site = None
+
+    def form_valid(self, form):
+        model = MODELS[form.cleaned_data['model']]
+        opts = model._meta
+        if not self.request.user.has_perms([f'{opts.app_label}.add_{opts.model_name}',
+                                            f'{opts.app_label}.change_{opts.model_name}']):
+            raise PermissionDenied
+
+        # файл читается построчно: большой загруженный файл Django держит на диске, а не в памяти
+        file = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+        try:
+            report = import_file(model, file, form.cleaned_data['format'])
+        except (ImportFileError, UnicodeDecodeError) as error:
+            form.add_error('file', str(error))
+            return self.form_invalid(form)
+        return self.render_to_response(self.get_context_data(form=form, report=report))
+
+    def get_context_data(self, **kwargs):
+        return {
+            **self.admin_site.each_context(self.request),
+            'title': _('import'),
+            **super().get_context_data(**kwargs),
+        }
@@ -0,0 +1,64 @@
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.forms.models import BaseInlineFormSet
+
+from .cache import cached
+
+
+class PreloadedAutocompleteSelect(AutocompleteSelect):
+    """AutocompleteSelect, который берёт подпись выбранного значения из preloaded.
+
+    Обычный виджет читает выбранный объект отдельным запросом при отрисовке
+    каждой строки инлайна; preloaded заполняет PreloadedInlineFormSet подписями
+    всех строк сразу. Если выбрано что-то другое (форма с ошибками),
+    виджет читает подписи из базы как обычно.
+    """
+    preloaded = None
+
+    def optgroups(self, name, value, attr=None):
+        selected = {str(v) for v in value if str(v) not in self.choices.field.empty_values}
+        if not self.preloaded or not selected <= self.preloaded.keys():
+            return super().optgroups(name, value, attr)
+
+        default = (None, [], 0)
+        if not self.is_required:
+            default[1].append(self.create_option(name, '', '', False, 0))
+        for option_value in selected:
+            default[1].append(
+                self.create_option(name, option_value, self.preloaded[option_value], selected, len(default[1]))
+            )
+        return [default]
+
+
+class PreloadedInlineFormSet(BaseInlineFormSet):
+    """Передаёт виджетам автодополнения подписи выбранных в строках объектов.
+
+    Подписи для поля читаются одним запросом по всем строкам родительского
+    объекта и кэшируются, пока не изменятся ни сам объект и его связи, ни
+    связанная модель (версии '<родитель>:<id>' и '<модель>').
+    """
+
+    def labels(self, name, field):
+        if name not in self._labels:
+            model = field.queryset.model
+            parent = f'{self.instance._meta.model_name}:{self.instance.pk}'
+
+            def compute():
+                rows = self.get_queryset().select_related(name)
+                return {str(getattr(row, f'{name}_id')): field.label_from_instance(getattr(row, name)) for row in rows}
+
+            self._labels[name] = cached(
+                (parent, model._meta.model_name), f'labels:{self.model._meta.model_name}:{name}:{parent}', compute,
+            )
+        return self._labels[name]
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        if form.instance.pk is None:
+            return form
+        if not hasattr(self, '_labels'):
+            self._labels = {}
+        for name, field in form.fields.items():
+            widget = getattr(field.widget, 'widget', field.widget)
+            if isinstance(widget, PreloadedAutocompleteSelect):
+                widget.preloaded = self.labels(name, field)
+        return form
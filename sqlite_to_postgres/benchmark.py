@@ -0,0 +1,363 @@
+"""Нагрузочный стенд для переноса SQLite -> Postgres.
+
+Генерирует синтетическую SQLite-базу с теми же пятью таблицами, прогоняет
+load_from_sqlite в каждой из выбранных стратегий и печатает JSON со скоростью,
+пиковой памятью и временем по таблицам. Каждая стратегия запускается в
+отдельном процессе, чтобы пиковый RSS не накапливался между прогонами.
+
+    python benchmark.py run --scale 10k --strategies insert,values,copy --output bench.json
+
+Postgres — одноразовая база: таблицы content.* создаются при необходимости и
+очищаются перед каждым прогоном. Параметры подключения берутся из BENCH_DB_NAME_PG,
+BENCH_DB_USER, BENCH_DB_PASSWORD, BENCH_HOST, BENCH_PORT, а при их отсутствии —
+из тех же переменных, что и у load_data.py.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import sqlite3
+import argparse
+import platform
+import resource
+import subprocess
+from contextlib import closing, redirect_stdout
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+from faker import Faker
+
+from load_data import LoadSettings, SQLiteExtractor, TABLES, conn_context, load_from_sqlite, load_parallel
+
+# Масштаб задаётся суммарным числом строк в таблицах связей
+SCALES = {
+    '10k': 10_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+
+# Стратегии загрузки: имя -> параметры LoadSettings
+STRATEGIES = {
+    'insert': {'mode': 'insert', 'queue_size': 0},
+    'values': {'mode': 'values'},
+    'copy': {'mode': 'copy'},
+    'copy-parallel': {'mode': 'copy', 'workers': 4},
+    'copy-partitioned': {'mode': 'copy', 'workers': 4, 'partition_size': 100_000},
+    'staging': {'mode': 'staging', 'workers': 4, 'rebuild_indexes': True},
+    'copy-readonly': {'mode': 'copy', 'read_only': True},
+}
+
+SEED = 20230701
+GENRES = 30
+# на каждый фильм: 2 жанра и 8 персон
+GENRES_PER_FILM = 2
+PERSONS_PER_FILM = 8
+ROLES = ('actor', 'director', 'writer')
+# размер пула уникальных текстов Faker: генерировать текст на каждую строку слишком долго
+POOL_SIZE = 10_000
+
+SQLITE_DDL = """
+CREATE TABLE film_work (
+    id TEXT PRIMARY KEY, title TEXT NOT NULL, description TEXT, creation_date DATE, file_path TEXT,
+    rating FLOAT, type TEXT NOT NULL, created_at timestamp with time zone, updated_at timestamp with time zone
+);
+CREATE TABLE genre (
+    id TEXT PRIMARY KEY, name TEXT NOT NULL, description TEXT,
+    created_at timestamp with time zone, updated_at timestamp with time zone
+);
+CREATE TABLE person (
+    id TEXT PRIMARY KEY, full_name TEXT NOT NULL,
+    created_at timestamp with time zone, updated_at timestamp with time zone
+);
+CREATE TABLE genre_film_work (
+    id TEXT PRIMARY KEY, film_work_id TEXT NOT NULL, genre_id TEXT NOT NULL, created_at timestamp with time zone
+);
+CREATE TABLE person_film_work (
+    id TEXT PRIMARY KEY, film_work_id TEXT NOT NULL, person_id TEXT NOT NULL, role TEXT NOT NULL,
+    created_at timestamp with time zone
+);
+"""
+
+POSTGRES_DDL = """
+CREATE SCHEMA IF NOT EXISTS content;
+CREATE TABLE IF NOT EXISTS content.film_work (
+    id uuid PRIMARY KEY, title varchar(100) NOT NULL, description TEXT, creation_date DATE, file_path TEXT,
+    rating FLOAT, type TEXT NOT NULL, created_at timestamp with time zone, updated_at timestamp with time zone
+);
+CREATE INDEX IF NOT EXISTS film_work_creation_date_idx ON content.film_work(creation_date, rating);
+CREATE TABLE IF NOT EXISTS content.genre (
+    id uuid PRIMARY KEY, name varchar(35) NOT NULL, description TEXT,
+    created_at timestamp with time zone, updated_at timestamp with time zone
+);
+CREATE TABLE IF NOT EXISTS content.person (
+    id uuid PRIMARY KEY, full_name varchar(255) NOT NULL,
+    created_at timestamp with time zone, updated_at timestamp with time zone
+);
+CREATE TABLE IF NOT EXISTS content.genre_film_work (
+    id uuid PRIMARY KEY,
+    film_work_id uuid NOT NULL REFERENCES content.film_work (id) ON DELETE CASCADE,
+    genre_id uuid NOT NULL REFERENCES content.genre (id) ON DELETE CASCADE,
+    created_at timestamp with time zone
+);
+CREATE UNIQUE INDEX IF NOT EXISTS genre_film_work_idx ON content.genre_film_work(film_work_id, genre_id);
+CREATE TABLE IF NOT EXISTS content.person_film_work (
+    id uuid PRIMARY KEY,
+    film_work_id uuid NOT NULL REFERENCES content.film_work (id) ON DELETE CASCADE,
+    person_id uuid NOT NULL REFERENCES content.person (id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    created_at timestamp with time zone
+);
+CREATE UNIQUE INDEX IF NOT EXISTS film_work_person_idx ON content.person_film_work(film_work_id, person_id, role);
+CREATE INDEX IF NOT EXISTS person_film_work_idx ON content.person_film_work(person_id, film_work_id);
+"""
+
+
+def pg_dsl() -> dict:
+    def env(name):
+        return os.environ.get(f'BENCH_{name}', os.environ.get(name))
+
+    return {
+        'dbname': env('DB_NAME_PG'),
+        'user': env('DB_USER'),
+        'password': env('DB_PASSWORD'),
+        'host': env('HOST'),
+        'port': int(env('PORT') or 5432),
+    }
+
+
+def timestamp(moment: datetime) -> str:
+    """Отметка времени в формате исходной базы: '2021-06-16 20:14:09.221838+00'"""
+    return moment.strftime('%Y-%m-%d %H:%M:%S.%f+00')
+
+
+def generate_sqlite(path: str, link_rows: int, seed: int = SEED):
+    """Создаёт SQLite-базу, в таблицах связей которой около link_rows строк"""
+    fake = Faker()
+    Faker.seed(seed)
+    rnd = random.Random(seed)
+
+    def new_id():
+        return str(uuid.UUID(int=rnd.getrandbits(128), version=4))
+
+    start = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+    def moment():
+        return timestamp(start + timedelta(seconds=rnd.randrange(365 * 24 * 3600), microseconds=rnd.randrange(10 ** 6)))
+
+    films = max(link_rows // (GENRES_PER_FILM + PERSONS_PER_FILM), 1)
+    persons = max(films, PERSONS_PER_FILM)
+    names = [fake.name() for _ in range(min(persons, POOL_SIZE))]
+    titles = [fake.sentence(nb_words=3)[:100] for _ in range(min(films, POOL_SIZE))]
+    texts = [fake.text(max_nb_chars=400) for _ in range(min(films, POOL_SIZE))]
+
+    if os.path.exists(path):
+        os.remove(path)
+    with closing(sqlite3.connect(path)) as conn:
+        conn.execute('PRAGMA journal_mode = OFF;')
+        conn.execute('PRAGMA synchronous = OFF;')
+        conn.executescript(SQLITE_DDL)
+
+        genre_ids = [new_id() for _ in range(GENRES)]
+        conn.executemany('INSERT INTO genre VALUES (?, ?, ?, ?, ?);', (
+            (genre_id, f'{fake.word()} {n}'[:35], fake.sentence(), moment(), moment())
+            for n, genre_id in enumerate(genre_ids)
+        ))
+
+        person_ids = [new_id() for _ in range(persons)]
+        conn.executemany('INSERT INTO person VALUES (?, ?, ?, ?);', (
+            (person_id, names[n % len(names)], moment(), moment())
+            for n, person_id in enumerate(person_ids)
+        ))
+
+        film_ids = [new_id() for _ in range(films)]
+        conn.executemany('INSERT INTO film_work VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);', (
+            (
+                film_id, titles[n % len(titles)], texts[n % len(texts)],
+                (start.date() - timedelta(days=rnd.randrange(36500))).isoformat(), None,
+                round(rnd.uniform(0, 100), 1), rnd.choice(('movie', 'tv_show')), moment(), moment(),
+            )
+            for n, film_id in enumerate(film_ids)
+        ))
+
+        # связи уникальны: у фильма n жанры (n + 7k) % GENRES и персоны (n * 8 + k) % persons
+        conn.executemany('INSERT INTO genre_film_work VALUES (?, ?, ?, ?);', (
+            (new_id(), film_id, genre_ids[(n + 7 * k) % GENRES], moment())
+            for n, film_id in enumerate(film_ids)
+            for k in range(GENRES_PER_FILM)
+        ))
+        conn.executemany('INSERT INTO person_film_work VALUES (?, ?, ?, ?, ?);', (
+            (new_id(), film_id, person_ids[(n * PERSONS_PER_FILM + k) % persons], ROLES[k % len(ROLES)], moment())
+            for n, film_id in enumerate(film_ids)
+            for k in range(PERSONS_PER_FILM)
+        ))
+        conn.commit()
+
+
+def prepare_postgres(dsl: dict):
+    """Создаёт схему при необходимости и очищает таблицы перед прогоном"""
+    with closing(psycopg2.connect(**dsl)) as pg_conn, pg_conn.cursor() as curs:
+        curs.execute(POSTGRES_DDL)
+        curs.execute('TRUNCATE content.person_film_work, content.genre_film_work, '
+                     'content.film_work, content.person, content.genre;')
+        pg_conn.commit()
+
+
+def measure(strategy: str, lite_path: str, dsl: dict, state_dir: str, batch_size: int = 0) -> dict:
+    """Один прогон стратегии в текущем процессе"""
+    metrics_file = os.path.join(state_dir, f'{strategy}.metrics.json')
+    settings = LoadSettings(**STRATEGIES[strategy], state_file=os.path.join(state_dir, f'{strategy}.state.json'),
+                            metrics_file=metrics_file, batch_size=batch_size)
+    prepare_postgres(dsl)
+
+    started = time.perf_counter()
+    # вывод загрузчика уходит в stderr, stdout остаётся под JSON
+    with redirect_stdout(sys.stderr):
+        if settings.workers > 1:
+            tables = load_parallel(lite_path, dsl, settings)
+        else:
+            with conn_context(lite_path, **settings.sqlite_options) as lite_conn, \
+                    closing(psycopg2.connect(**dsl)) as pg_conn:
+                tables = load_from_sqlite(lite_conn, pg_conn, settings)
+    seconds = time.perf_counter() - started
+
+    with open(metrics_file, encoding='utf-8') as summary_file:
+        summary = json.load(summary_file)
+    rows = sum(table['rows'] for table in tables.values())
+    for name, table in tables.items():
+        table['rows_per_sec'] = table['rows'] / table['seconds'] if table['seconds'] else None
+        table['stage_seconds'] = summary['tables'][name]['stage_seconds']
+    return {
+        'strategy': strategy,
+        'settings': {**STRATEGIES[strategy], 'batch_size': batch_size},
+        'rows': rows,
+        'seconds': seconds,
+        'rows_per_sec': rows / seconds if seconds else None,
+        # на Linux ru_maxrss в килобайтах
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'tables': tables,
+    }
+
+
+def scan(lite_path: str, read_only: bool, batch_size: int = 10_000) -> dict:
+    """Чтение всех таблиц через SQLiteExtractor без записи в Postgres"""
+    started = time.perf_counter()
+    rows = 0
+    with conn_context(lite_path, **LoadSettings(read_only=read_only).sqlite_options) as lite_conn:
+        extractor = SQLiteExtractor(lite_conn)
+        for table, model in TABLES.items():
+            for batch in extractor.extract_movies(table, model, batch_size=batch_size):
+                rows += len(batch)
+    seconds = time.perf_counter() - started
+    return {
+        'read_only': read_only,
+        'rows': rows,
+        'seconds': seconds,
+        'rows_per_sec': rows / seconds if seconds else None,
+        'mb_per_sec': os.path.getsize(lite_path) / 2 ** 20 / seconds if seconds else None,
+    }
+
+
+def compare_scans(lite_path: str, repeat: int = 3) -> dict:
+    """Скорость чтения источника с настройками по умолчанию и в режиме read_only.
+
+    Прогоны чередуются, чтобы оба варианта одинаково попадали в страничный кэш ОС;
+    берётся лучший из repeat прогонов.
+    """
+    runs = {False: [], True: []}
+    for _ in range(repeat):
+        for read_only in runs:
+            runs[read_only].append(scan(lite_path, read_only))
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'lite_path': lite_path,
+        'bytes': os.path.getsize(lite_path),
+        'results': [min(results, key=lambda result: result['seconds']) for results in runs.values()],
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', 'HEAD'), capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scale: str, strategies: list, data_dir: str, batch_size: int = 0) -> dict:
+    lite_path = os.path.join(data_dir, f'bench_{scale}_{SEED}.db')
+    if not os.path.exists(lite_path):
+        print(f'generating {lite_path}', file=sys.stderr)
+        generate_sqlite(lite_path, SCALES[scale])
+
+    results = []
+    for strategy in strategies:
+        print(f'running {strategy}', file=sys.stderr)
+        child = subprocess.run(
+            (sys.executable, os.path.abspath(__file__), 'measure', strategy, lite_path, '--data-dir', data_dir,
+             '--batch-size', str(batch_size)),
+            stdout=subprocess.PIPE, text=True, check=True,
+        )
+        results.append(json.loads(child.stdout))
+
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'scale': scale,
+        'link_rows': SCALES[scale],
+        'seed': SEED,
+        'results': results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Нагрузочный стенд переноса SQLite -> Postgres')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate_cmd = commands.add_parser('generate', help='только сгенерировать SQLite-базу')
+    generate_cmd.add_argument('path')
+    generate_cmd.add_argument('--scale', choices=SCALES, default='10k')
+
+    run_cmd = commands.add_parser('run', help='прогнать стратегии и напечатать JSON')
+    run_cmd.add_argument('--scale', choices=SCALES, default='10k')
+    run_cmd.add_argument('--strategies', default=','.join(STRATEGIES),
+                         help=f'через запятую из: {", ".join(STRATEGIES)}')
+    run_cmd.add_argument('--data-dir', default='.bench')
+    run_cmd.add_argument('--output', help='файл для JSON (по умолчанию stdout)')
+    run_cmd.add_argument('--batch-size', type=int, default=0,
+                         help='фиксированный размер пачки для воспроизводимых замеров (0 — адаптивный)')
+
+    measure_cmd = commands.add_parser('measure', help='один прогон в отдельном процессе (используется run)')
+    measure_cmd.add_argument('strategy', choices=STRATEGIES)
+    measure_cmd.add_argument('lite_path')
+    measure_cmd.add_argument('--data-dir', default='.bench')
+    measure_cmd.add_argument('--batch-size', type=int, default=0)
+
+    scan_cmd = commands.add_parser('scan', help='сравнить скорость чтения SQLite без записи в Postgres')
+    scan_cmd.add_argument('lite_path')
+    scan_cmd.add_argument('--repeat', type=int, default=3)
+
+    cli = parser.parse_args()
+    if cli.command == 'generate':
+        generate_sqlite(cli.path, SCALES[cli.scale])
+    elif cli.command == 'scan':
+        print(json.dumps(compare_scans(cli.lite_path, cli.repeat), indent=2))
+    elif cli.command == 'measure':
+        print(json.dumps(measure(cli.strategy, cli.lite_path, pg_dsl(), cli.data_dir, cli.batch_size)))
+    else:
+        strategies = cli.strategies.split(',')
+        unknown = set(strategies) - set(STRATEGIES)
+        if unknown:
+            parser.error(f'неизвестные стратегии: {", ".join(sorted(unknown))}')
+        os.makedirs(cli.data_dir, exist_ok=True)
+        report = json.dumps(run(cli.scale, strategies, cli.data_dir, cli.batch_size), indent=2)
+        if cli.output:
+            with open(cli.output, 'w', encoding='utf-8') as output:
+                output.write(report)
+        else:
+            print(report)
@@ -9,6 +9,8 @@ from contextlib import contextmanager, closing
 import psycopg2
 from psycopg2.extras import DictCursor
 
+from verify_data import verify_all
+
 load_dotenv()
 
 
@@ -53,3 +55,7 @@ def pg_conn(load_env):
     return psycopg2.connect(**dsl, cursor_factory=DictCursor)
 
 
+@pytest.fixture(scope="module")
+def verification(lite_conn, pg_conn):
+    # один последовательный проход по каждой таблице вместо запроса на каждую строку
+    return verify_all(lite_conn, pg_conn)
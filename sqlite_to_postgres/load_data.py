@@ -1,17 +1,32 @@
+import io
 import os
+import re
+import json
+import time
 import uuid
+import argparse
+import pathlib
+import threading
+
+from queue import Queue, Full
+from collections import Counter
+from functools import lru_cache
+from operator import attrgetter
 
 import sqlite3
 from contextlib import contextmanager, closing
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 import psycopg2
 from psycopg2.extensions import connection as _connection
-from psycopg2.extras import DictCursor
+from psycopg2.extras import DictCursor, execute_values
 
 from datetime import datetime, date
 from dotenv import load_dotenv
 
-from dataclasses import dataclass, field, fields, astuple
+from dataclasses import dataclass, field, fields, is_dataclass
+
+from metrics import Metrics
 
 load_dotenv()
 
@@ -76,73 +91,1012 @@ class PersonFilmworkModel(BasicModel):
     created_at: datetime
 
 
+@lru_cache(maxsize=None)
+def columns(model) -> tuple:
+    """Порядок колонок модели: в нём строки читаются из SQLite и пишутся в Postgres"""
+    return tuple(field.name for field in fields(model))
+
+
+def as_rows(model, rows):
+    """Пачка в виде кортежей в порядке columns(model).
+
+    Кортежи из курсора возвращаются как есть; экземпляры моделей разворачиваются
+    без глубокого копирования значений, в отличие от dataclasses.astuple.
+    """
+    if rows and is_dataclass(rows[0]):
+        getter = attrgetter(*columns(model))
+        return [getter(row) for row in rows]
+    return rows
+
+
+# Текстовые форматы SQLite, которые Postgres принимает без преобразования
+TEXT_FORMATS = {
+    datetime: re.compile(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(\.\d{1,6})?([+-]\d{2}(:?\d{2})?)?'),
+    date: re.compile(r'\d{4}-\d{2}-\d{2}'),
+    uuid.UUID: re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.IGNORECASE),
+}
+
+
+@lru_cache(maxsize=65536)
+def parse_timestamp(value: str) -> datetime:
+    """Отметка времени SQLite ('2021-06-16 20:14:09.221838+00'); повторяющиеся значения берутся из кэша"""
+    if re.search(r'[+-]\d{2}$', value):
+        value += ':00'
+    return datetime.fromisoformat(value)
+
+
+@lru_cache(maxsize=65536)
+def parse_date(value: str) -> date:
+    return date.fromisoformat(value)
+
+
+@lru_cache(maxsize=65536)
+def parse_uuid(value: str) -> str:
+    """UUID в каноническом текстовом виде"""
+    return str(uuid.UUID(value))
+
+
+PARSERS = {datetime: parse_timestamp, date: parse_date, uuid.UUID: parse_uuid}
+
+
+def text_conversions(model, records) -> tuple:
+    """Разовая проверка формата текстовых значений по колонкам.
+
+    Возвращает пары (индекс колонки, функция разбора) для колонок, значения
+    которых нельзя передать в Postgres как есть. Уже разобранные значения
+    (соединение с PARSE_DECLTYPES) и колонки в ожидаемом формате пропускаются.
+    """
+    conversions = []
+    for index, model_field in enumerate(fields(model)):
+        pattern = TEXT_FORMATS.get(model_field.type)
+        if pattern is None:
+            continue
+        sample = next((record[index] for record in records if record[index] is not None), None)
+        if isinstance(sample, str) and not pattern.fullmatch(sample):
+            conversions.append((index, PARSERS[model_field.type]))
+    return tuple(conversions)
+
+
+def watermark_column(model) -> str:
+    """Колонка, по которой отслеживаются изменения строк модели"""
+    return 'updated_at' if 'updated_at' in columns(model) else 'created_at'
+
+
+def convert(record, conversions):
+    values = list(record)
+    for index, parse in conversions:
+        if isinstance(values[index], str):
+            values[index] = parse(values[index])
+    return tuple(values)
+
+
+class Batch(list):
+    """Пачка строк; end — rowid, до которого (не включая) таблица прочитана"""
+
+    def __init__(self, records, end):
+        super().__init__(records)
+        self.end = end
+
+
+class BatchSizer:
+    """Подбор размера пачки под объём в байтах и время записи.
+
+    Ширина строки оценивается по выборке из прочитанных пачек (первый раз — по
+    первым строкам таблицы, до чтения первой пачки), скорость — по времени
+    записи и коммита. Следующая пачка — наименьшая из оценок
+    «target_bytes / ширина строки» и «скорость * target_latency», но не больше
+    max_bytes / ширина строки; за шаг размер меняется не более чем вдвое.
+    С fixed > 0 размер постоянный (для воспроизводимых замеров), но предел
+    max_bytes по-прежнему действует.
+    """
+
+    MIN_SIZE = 10
+    MAX_SIZE = 100_000
+    # строк из пачки, по которым оценивается ширина
+    SAMPLE = 16
+
+    def __init__(self, fixed=0, target_bytes=4 * 2 ** 20, target_latency=0.5, max_bytes=64 * 2 ** 20, initial=100):
+        self.fixed = fixed
+        self.target_bytes = target_bytes
+        self.target_latency = target_latency
+        self.max_bytes = max_bytes
+        self.size = fixed or initial
+        self.row_bytes = None
+        # строк в секунду по последним записанным пачкам
+        self.rows_per_second = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def row_width(row) -> int:
+        # приблизительный объём строки: длина текстовых значений и 8 байт на остальные
+        return sum(len(value) if isinstance(value, str) else 8 for value in row)
+
+    def observe_rows(self, records):
+        """Учитывает ширину строк прочитанной пачки"""
+        sample = records[:self.SAMPLE]
+        width = max(sum(map(self.row_width, sample)) / len(sample), 1)
+        with self._lock:
+            self.row_bytes = width if self.row_bytes is None else 0.8 * self.row_bytes + 0.2 * width
+            self._resize()
+
+    def observe_latency(self, rows, seconds):
+        """Учитывает время записи и коммита пачки из rows строк"""
+        if seconds <= 0:
+            return
+        rate = rows / seconds
+        with self._lock:
+            self.rows_per_second = rate if self.rows_per_second is None else 0.8 * self.rows_per_second + 0.2 * rate
+            self._resize()
+
+    def _resize(self):
+        cap = self.max_bytes / self.row_bytes if self.row_bytes else self.MAX_SIZE
+        if self.fixed:
+            self.size = int(max(1, min(self.fixed, cap)))
+            return
+        estimates = [self.MAX_SIZE, cap]
+        if self.row_bytes:
+            estimates.append(self.target_bytes / self.row_bytes)
+        if self.rows_per_second:
+            estimates.append(self.rows_per_second * self.target_latency)
+        size = max(min(min(estimates), self.size * 2), self.size / 2)
+        self.size = int(max(self.MIN_SIZE, min(size, cap)))
+
+
 class SQLiteExtractor:
-    def __init__(self, connection: sqlite3.Connection):
+    def __init__(self, connection: sqlite3.Connection, metrics: Metrics = None):
         self.conn = connection
+        self.metrics = metrics or Metrics()
+        # таблица -> колонки, требующие разбора (см. text_conversions)
+        self._conversions = {}
 
-    def extract_movies(self, table, model, is_now=False):
+    def bounds(self, table):
+        """Полуинтервал rowid [первый, последний + 1), покрывающий все строки, или None для пустой таблицы"""
         curs = self.conn.cursor()
+        curs.execute(f'SELECT MIN(rowid), MAX(rowid) FROM {table};')
+        first, last = curs.fetchone()
+        return None if first is None else (first, last + 1)
 
-        curs.execute(f'SELECT * FROM {table};')
+    def high_water_mark(self, table, model):
+        """Текущее максимальное значение колонки изменений в исходном (текстовом) виде"""
+        curs = self.conn.cursor()
+        curs.execute(f'SELECT MAX({watermark_column(model)}) FROM {table};')
+        return curs.fetchone()[0]
+
+    def count(self, table, model, rowid_range=None, changed_since=None):
+        """Число строк, которые прочитает extract_movies с теми же параметрами"""
+        query, params = f'SELECT COUNT(*) FROM {table} WHERE 1 = 1', []
+        if rowid_range:
+            query += ' AND rowid >= ? AND rowid < ?'
+            params += rowid_range
+        if changed_since is not None:
+            query += f' AND {watermark_column(model)} > ?'
+            params.append(changed_since)
+        curs = self.conn.cursor()
+        curs.execute(f'{query};', params)
+        return curs.fetchone()[0]
+
+    def partitions(self, table, partition_size):
+        """Делит таблицу на диапазоны rowid шириной partition_size, покрывающие все строки"""
+        if not (bounds := self.bounds(table)):
+            return []
+        first, stop = bounds
+        return [(start, min(start + partition_size, stop)) for start in range(first, stop, partition_size)]
+
+    def extract_movies(self, table, model, is_now=False, rowid_range=None, as_models=False, batch_size=100,
+                       changed_since=None, sizer: BatchSizer = None):
+        """Пачки строк таблицы кортежами в порядке columns(model).
+
+        Таблица читается окнами по batch_size значений rowid (или по размеру,
+        который подбирает sizer), поэтому у каждой пачки известна граница end,
+        с которой можно продолжить после перезапуска.
+        С changed_since читаются только строки, изменённые позже этой отметки.
+        С as_models=True строки собираются в экземпляры модели — для проверок и тестов.
+        """
+        curs = self.conn.cursor()
+        # кортежи прямо из курсора, без sqlite3.Row и промежуточного dict
+        curs.row_factory = None
+        column_names = ', '.join(columns(model))
+        changed, params = '', ()
+        if changed_since is not None:
+            changed, params = f' AND {watermark_column(model)} > ?', (changed_since,)
+        window = f'SELECT {column_names} FROM {table} WHERE rowid >= ? AND rowid < ?{changed}'
+
+        # полуинтервал [start, stop) по rowid — вся таблица или одна её партиция
+        if not (rowid_range := rowid_range or self.bounds(table)):
+            return
+        start, stop = rowid_range
+
+        if sizer and sizer.row_bytes is None:
+            # ширина строки нужна до первой пачки: иначе она читается без предела max_bytes
+            curs.execute(f'{window} LIMIT {BatchSizer.SAMPLE};', (start, stop, *params))
+            if sample := curs.fetchall():
+                sizer.observe_rows(sample)
+
+        while start < stop:
+            end = min(start + (sizer.size if sizer else batch_size), stop)
+            with self.metrics.timer(table, 'extract'):
+                curs.execute(f'{window};', (start, end, *params))
+                records = curs.fetchall()
+            if records:
+                if sizer:
+                    sizer.observe_rows(records)
+                if table not in self._conversions:
+                    self._conversions[table] = text_conversions(model, records)
+                if conversions := self._conversions[table]:
+                    with self.metrics.timer(table, 'transform'):
+                        records = [convert(record, conversions) for record in records]
+                if as_models:
+                    records = [model(*record) for record in records]
+                yield Batch(records, end)
+                start = end
+                continue
+            # пустое окно: перескакиваем разрыв в rowid (или неизменённые строки) одним запросом
+            curs.execute(f'SELECT MIN(rowid) FROM {table} WHERE rowid >= ?{changed};', (end, *params))
+            start = curs.fetchone()[0]
+            if start is None:
+                return
+
+
+class StateFile:
+    """Локальный JSON-файл состояния загрузки, переписываемый атомарно"""
+
+    def __init__(self, path: str, load: bool = True):
+        self.path = path
+        self.state = {}
+        self._lock = threading.Lock()
+        if load and os.path.exists(path):
+            with open(path, encoding='utf-8') as state_file:
+                self.state = json.load(state_file)
+
+    def _write(self, key, value):
+        with self._lock:
+            self.state[key] = value
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as state_file:
+                json.dump(self.state, state_file, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+class Checkpoints(StateFile):
+    """Прогресс загрузки.
+
+    Ключ — таблица или её диапазон rowid, значение — rowid, до которого строки
+    закоммичены в Postgres, и число перенесённых строк. Файл переписывается
+    после каждого коммита, поэтому после падения в нём остаётся последняя
+    зафиксированная позиция.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        super().__init__(path, load=resume)
 
-        while records := curs.fetchmany(100):
-            loaded_data = [model(**dict(record)) for record in records]
-            yield loaded_data
+    @staticmethod
+    def key(table, rowid_range=None):
+        return f'{table}:{rowid_range[0]}' if rowid_range else table
+
+    def get(self, key):
+        """Последняя закоммиченная позиция (rowid, строк) или (None, 0)"""
+        checkpoint = self.state.get(key, {})
+        return checkpoint.get('rowid'), checkpoint.get('rows', 0)
+
+    def save(self, key, rowid, rows):
+        self._write(key, {'rowid': rowid, 'rows': rows})
+
+
+class Watermarks(StateFile):
+    """Верхние отметки инкрементальной синхронизации: таблица -> максимальное значение
+    updated_at (или created_at для таблиц связей) на момент прошлой успешной загрузки"""
+
+    def get(self, table):
+        return self.state.get(table)
+
+    def save(self, table, value):
+        if value is not None:
+            self._write(table, value)
+
+
+# Режимы записи в Postgres: построчный INSERT, многострочный INSERT, COPY через временную таблицу
+# и staging — COPY всей таблицы в UNLOGGED-таблицу с проверкой и одним слиянием в конце
+LOAD_MODES = ('insert', 'values', 'copy', 'staging')
+
+# Границы транзакций: после каждой пачки, после всей таблицы или каждые N строк
+COMMIT_POLICIES = ('batch', 'table')
+
+
+@dataclass
+class LoadSettings:
+    mode: str = field(default='insert')
+    # число строк в одном многострочном INSERT режима values
+    page_size: int = field(default=1000)
+    commit: str = field(default='batch')
+    # число потоков параллельной загрузки, у каждого свои соединения с SQLite и Postgres
+    workers: int = field(default=1)
+    # сколько готовых пачек чтение может опережать запись; 0 — без отдельного потока чтения
+    queue_size: int = field(default=4)
+    # ширина диапазона rowid для параллельной загрузки одной таблицы; 0 — таблица целиком
+    partition_size: int = field(default=0)
+    # сводка метрик в JSON и textfile Prometheus; пустая строка — не писать
+    metrics_file: str = field(default='load_metrics.json')
+    prometheus_file: str = field(default='')
+    # как часто печатать прогресс, в секундах; 0 — не печатать
+    progress_interval: float = field(default=5.0)
+    # файл с позициями закоммиченных пачек; пустая строка отключает контрольные точки
+    state_file: str = field(default='load_state.json')
+    # продолжить с позиций из state_file вместо загрузки с начала
+    resume: bool = field(default=False)
+    # переносить только строки, изменённые после прошлой загрузки, с обновлением изменившихся
+    incremental: bool = field(default=False)
+    watermark_file: str = field(default='sync_state.json')
+    # режим staging: при загрузке в пустую таблицу снять вторичные индексы и внешние ключи
+    # на время слияния и построить их заново одним проходом
+    rebuild_indexes: bool = field(default=False)
+    # разбирать отметки времени и даты SQLite в объекты Python вместо передачи текста как есть
+    parse_types: bool = field(default=False)
+    # размер пачки в строках; 0 — подбирать под batch_bytes и batch_latency
+    batch_size: int = field(default=0)
+    batch_bytes: int = field(default=4 * 2 ** 20)
+    batch_latency: float = field(default=0.5)
+    # жёсткий предел объёма одной пачки, в том числе при фиксированном batch_size
+    max_batch_bytes: int = field(default=64 * 2 ** 20)
+    # открыть SQLite только на чтение, с mmap и увеличенным кэшем страниц под последовательный проход
+    read_only: bool = field(default=False)
+    mmap_size: int = field(default=256 * 2 ** 20)
+    cache_size: int = field(default=64 * 2 ** 20)
+    # каталог для согласованной копии SQLite-базы на время загрузки; пустая строка — читать сам файл
+    snapshot_dir: str = field(default='')
+
+    def __post_init__(self):
+        if self.mode not in LOAD_MODES:
+            raise ValueError(f'Неизвестный режим загрузки: {self.mode}')
+        if self.page_size < 1:
+            raise ValueError('page_size должен быть положительным')
+        if self.commit not in COMMIT_POLICIES and not (str(self.commit).isdigit() and int(self.commit) > 0):
+            raise ValueError(f'Неизвестная политика коммитов: {self.commit}')
+        if self.workers < 1:
+            raise ValueError('workers должен быть положительным')
+        if self.queue_size < 0:
+            raise ValueError('queue_size не может быть отрицательным')
+        if self.partition_size < 0:
+            raise ValueError('partition_size не может быть отрицательным')
+        if self.batch_size < 0:
+            raise ValueError('batch_size не может быть отрицательным')
+        if not 0 < self.batch_bytes <= self.max_batch_bytes:
+            raise ValueError('batch_bytes должен быть положительным и не больше max_batch_bytes')
+        if self.batch_latency <= 0:
+            raise ValueError('batch_latency должен быть положительным')
+        if self.mmap_size < 0 or self.cache_size < 0:
+            raise ValueError('mmap_size и cache_size не могут быть отрицательными')
+
+    @property
+    def commit_rows(self):
+        """Число строк между коммитами или None, если граница задаётся пачкой/таблицей"""
+        return None if self.commit in COMMIT_POLICIES else int(self.commit)
+
+    @property
+    def sqlite_options(self):
+        """Параметры conn_context для чтения источника"""
+        return {
+            'parse_types': self.parse_types,
+            'read_only': self.read_only,
+            'mmap_size': self.mmap_size,
+            'cache_size': self.cache_size,
+        }
+
+
+def copy_value(value) -> str:
+    """Представление значения в текстовом формате COPY"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+class StagingIntegrityError(Exception):
+    """Данные в staging-таблице нарушают ограничения целевой таблицы; слияние не выполнялось"""
+
+    def __init__(self, table, problems):
+        self.table = table
+        self.problems = problems
+        super().__init__(f'{table}: ' + '; '.join(problems))
 
 
 class PostgresSaver:
-    def __init__(self, connection: _connection):
+    def __init__(self, connection: _connection, settings: LoadSettings = None, metrics: Metrics = None):
         self.conn = connection
+        self.settings = settings or LoadSettings()
+        self.metrics = metrics or Metrics()
+        self._table = None
+        self._staging = set()
+        self._uncommitted = 0
+        # в инкрементальном режиме: inserted / updated / skipped
+        self.stats = Counter()
 
     def save_all_data(self, table, model, rows):
+        """Записывает пачку; возвращает True, если после неё транзакция закоммичена"""
+        self._table = table
+        with self.metrics.timer(table, 'transform'):
+            rows = as_rows(model, rows)
+        if self.settings.mode == 'copy':
+            self._copy_rows(table, model, rows)
+        elif self.settings.mode == 'staging':
+            self._stage_rows(table, model, rows)
+        else:
+            with self.metrics.timer(table, 'load'):
+                if self.settings.mode == 'values':
+                    self._insert_values(table, model, rows)
+                else:
+                    self._insert_rows(table, model, rows)
+
+        self._uncommitted += len(rows)
+        if self.settings.commit == 'batch':
+            self.commit()
+            return True
+        if self.settings.commit_rows and self._uncommitted >= self.settings.commit_rows:
+            self.commit()
+            return True
+        return False
+
+    def commit(self):
+        """Фиксирует всё, что записано с прошлого коммита"""
+        with self.metrics.timer(self._table, 'commit'):
+            self.conn.commit()
+        self._uncommitted = 0
+
+    def on_conflict(self, model):
+        """Обработка существующих id: пропуск, а в инкрементальном режиме — обновление,
+        только если значения действительно отличаются"""
+        if not self.settings.incremental:
+            return 'ON CONFLICT (id) DO NOTHING'
+        names = [name for name in columns(model) if name != 'id']
+        assignments = ', '.join(f'{name} = EXCLUDED.{name}' for name in names)
+        current = ', '.join(f'target.{name}' for name in names)
+        incoming = ', '.join(f'EXCLUDED.{name}' for name in names)
+        # xmax = 0 только у только что вставленной строки
+        return (f'ON CONFLICT (id) DO UPDATE SET {assignments} '
+                f'WHERE ({current}) IS DISTINCT FROM ({incoming}) RETURNING (xmax = 0)')
+
+    def _count(self, rows, results):
+        """Учитывает вставленные, обновлённые и пропущенные строки по RETURNING"""
+        inserted = sum(1 for (is_new,) in results if is_new)
+        self.stats['inserted'] += inserted
+        self.stats['updated'] += len(results) - inserted
+        self.stats['skipped'] += len(rows) - len(results)
+
+    def _insert_rows(self, table, model, rows):
+        results = []
         with self.conn.cursor() as curs:
             # получаем имена полей из модели
-            column_names = ', '.join(field.name for field in fields(model))
+            column_names = ', '.join(columns(model))
             # %s под количество вставляемых значений
-            template = ', '.join(['%s'] * len(fields(model)))
+            template = ', '.join(['%s'] * len(columns(model)))
             for row in rows:
-                res = curs.mogrify(f'({template})', astuple(row)).decode('utf-8')
+                res = curs.mogrify(f'({template})', row).decode('utf-8')
                 query = f"""
-                    INSERT INTO content.{table} ({column_names}) VALUES {res} ON CONFLICT (id) DO NOTHING;
+                    INSERT INTO content.{table} AS target ({column_names}) VALUES {res} {self.on_conflict(model)};
                 """
                 curs.execute(query)
+                if self.settings.incremental:
+                    results.extend(curs.fetchall())
+        if self.settings.incremental:
+            self._count(rows, results)
+
+    def _insert_values(self, table, model, rows):
+        """Пачка уходит многострочными INSERT по page_size строк"""
+        column_names = ', '.join(columns(model))
+        with self.conn.cursor() as curs:
+            results = execute_values(
+                curs,
+                f'INSERT INTO content.{table} AS target ({column_names}) VALUES %s {self.on_conflict(model)};',
+                rows,
+                page_size=self.settings.page_size,
+                fetch=self.settings.incremental,
+            )
+        if self.settings.incremental:
+            self._count(rows, results)
+
+    def _copy_buffer(self, table, rows):
+        """Пачка в текстовом формате COPY"""
+        with self.metrics.timer(table, 'transform'):
+            buffer = io.StringIO()
+            for row in rows:
+                buffer.write('\t'.join(copy_value(value) for value in row))
+                buffer.write('\n')
+            buffer.seek(0)
+        return buffer
+
+    def _copy_rows(self, table, model, rows):
+        """Пачка уходит одним COPY во временную таблицу и переносится в целевую с ON CONFLICT"""
+        column_names = ', '.join(columns(model))
+        staging = f'staging_{table}'
+        buffer = self._copy_buffer(table, rows)
+
+        with self.metrics.timer(table, 'load'), self.conn.cursor() as curs:
+            if table not in self._staging:
+                # временная таблица живёт до конца сессии, поэтому создаётся один раз
+                curs.execute(f'CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE content.{table} INCLUDING DEFAULTS);')
+                self._staging.add(table)
+            curs.copy_expert(f'COPY {staging} ({column_names}) FROM STDIN;', buffer)
+            curs.execute(f"""
+                INSERT INTO content.{table} AS target ({column_names})
+                SELECT {column_names} FROM {staging}
+                {self.on_conflict(model)};
+            """)
+            if self.settings.incremental:
+                self._count(rows, curs.fetchall())
+            curs.execute(f'TRUNCATE {staging};')
+
+    @staticmethod
+    def staging_table(table):
+        return f'content.{table}_staging'
+
+    def prepare_staging(self, table, keep=False):
+        """Создаёт UNLOGGED staging-таблицу без индексов; без keep очищает её.
+
+        Таблица общая для всех соединений, поэтому её заполняют параллельные
+        диапазоны одной таблицы; при resume (keep) загруженное ранее сохраняется.
+        """
+        staging = self.staging_table(table)
+        with self.conn.cursor() as curs:
+            curs.execute(f'CREATE UNLOGGED TABLE IF NOT EXISTS {staging} (LIKE content.{table} INCLUDING DEFAULTS);')
+            if not keep:
+                curs.execute(f'TRUNCATE {staging};')
+        self.conn.commit()
+
+    def _stage_rows(self, table, model, rows):
+        """Пачка уходит одним COPY в staging-таблицу; в целевую она попадёт при merge_staging"""
+        buffer = self._copy_buffer(table, rows)
+        with self.metrics.timer(table, 'load'), self.conn.cursor() as curs:
+            curs.copy_expert(f'COPY {self.staging_table(table)} ({", ".join(columns(model))}) FROM STDIN;', buffer)
+
+    def _unique_keys(self, curs, table):
+        """(колонки, NULL различаются) уникальных индексов целевой таблицы, кроме первичного ключа"""
+        # indnullsnotdistinct есть с Postgres 15; через to_jsonb запрос работает и на старых версиях
+        curs.execute("""
+            SELECT array_agg(a.attname ORDER BY k.n),
+                   NOT COALESCE((to_jsonb(i) ->> 'indnullsnotdistinct')::boolean, false)
+            FROM pg_index i
+            CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, n)
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+            WHERE i.indrelid = %s::regclass AND i.indisunique AND NOT i.indisprimary
+            GROUP BY i.indexrelid;
+        """, (f'content.{table}',))
+        return [(list(keys), nulls_distinct) for keys, nulls_distinct in curs.fetchall()]
+
+    def check_staging(self, curs, table, parents):
+        """Проверки staging-таблицы перед слиянием; возвращает список нарушений"""
+        staging = self.staging_table(table)
+        problems = []
+
+        curs.execute(f'SELECT COUNT(*) - COUNT(DISTINCT id) FROM {staging};')
+        if duplicates := curs.fetchone()[0]:
+            problems.append(f'{duplicates} rows share an id with different values')
+
+        for parent in sorted(parents):
+            curs.execute(f"""
+                SELECT COUNT(*) FROM {staging} s
+                WHERE NOT EXISTS (SELECT 1 FROM content.{parent} p WHERE p.id = s.{parent}_id);
+            """)
+            if orphans := curs.fetchone()[0]:
+                problems.append(f'{orphans} rows reference missing {parent} rows')
+
+        for keys, nulls_distinct in self._unique_keys(curs, table):
+            key_names = ', '.join(keys)
+            # GROUP BY объединяет NULL, а обычный уникальный индекс считает их разными значениями
+            not_null = ' AND '.join(f'{key} IS NOT NULL' for key in keys) if nulls_distinct else 'TRUE'
+            curs.execute(f"""
+                SELECT COUNT(*) FROM (
+                    SELECT {key_names} FROM {staging} WHERE {not_null}
+                    GROUP BY {key_names} HAVING COUNT(*) > 1
+                ) AS duplicates;
+            """)
+            if duplicates := curs.fetchone()[0]:
+                problems.append(f'{duplicates} duplicate ({key_names}) values')
+            equal = '=' if nulls_distinct else 'IS NOT DISTINCT FROM'
+            join = ' AND '.join(f't.{key} {equal} s.{key}' for key in keys)
+            curs.execute(f'SELECT COUNT(*) FROM {staging} s JOIN content.{table} t ON {join} AND t.id <> s.id;')
+            if conflicts := curs.fetchone()[0]:
+                problems.append(f'{conflicts} ({key_names}) values already used by other rows')
+        return problems
+
+    def merge_staging(self, table, model, parents=()):
+        """Переносит staging-таблицу в целевую одним INSERT ... SELECT ... ON CONFLICT.
+
+        Перед слиянием из staging удаляются полные дубликаты строк (повторно
+        загруженные после resume пачки) и выполняются проверки check_staging;
+        при нарушениях целевая таблица не меняется. При rebuild_indexes и пустой
+        целевой таблице вторичные индексы и внешние ключи снимаются на время
+        слияния и создаются заново в той же транзакции.
+        """
+        staging = self.staging_table(table)
+        column_names = ', '.join(columns(model))
+        stats = Counter(self.stats)
+        with self.metrics.timer(table, 'load'), self.conn.cursor() as curs:
+            curs.execute(f"""
+                DELETE FROM {staging} a USING {staging} b
+                WHERE a.ctid < b.ctid AND a.id = b.id AND (a.*) IS NOT DISTINCT FROM (b.*);
+            """)
+            if problems := self.check_staging(curs, table, parents):
+                self.conn.rollback()
+                raise StagingIntegrityError(table, problems)
+
+            indexes, foreign_keys = [], []
+            curs.execute(f'SELECT NOT EXISTS (SELECT 1 FROM content.{table});')
+            if self.settings.rebuild_indexes and curs.fetchone()[0]:
+                curs.execute("""
+                    SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+                    WHERE conrelid = %s::regclass AND contype = 'f';
+                """, (f'content.{table}',))
+                foreign_keys = curs.fetchall()
+                curs.execute("""
+                    SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid) FROM pg_index i
+                    WHERE i.indrelid = %s::regclass AND NOT i.indisprimary
+                      AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid);
+                """, (f'content.{table}',))
+                indexes = curs.fetchall()
+                for name, _ in foreign_keys:
+                    curs.execute(f'ALTER TABLE content.{table} DROP CONSTRAINT {name};')
+                for name, _ in indexes:
+                    curs.execute(f'DROP INDEX {name};')
+
+            curs.execute(f"""
+                INSERT INTO content.{table} AS target ({column_names})
+                SELECT {column_names} FROM {staging}
+                {self.on_conflict(model)};
+            """)
+            if self.settings.incremental:
+                results = curs.fetchall()
+                curs.execute(f'SELECT COUNT(*) FROM {staging};')
+                self._count(range(curs.fetchone()[0]), results)
+
+            for _, definition in indexes:
+                curs.execute(f'{definition};')
+            for name, definition in foreign_keys:
+                # ссылки уже проверены в check_staging, VALIDATE — один проход по таблице
+                curs.execute(f'ALTER TABLE content.{table} ADD CONSTRAINT {name} {definition} NOT VALID;')
+                curs.execute(f'ALTER TABLE content.{table} VALIDATE CONSTRAINT {name};')
+            curs.execute(f'DROP TABLE {staging};')
+        with self.metrics.timer(table, 'commit'):
             self.conn.commit()
+        if self.settings.incremental:
+            print_stats(table, self.stats - stats)
+
+
+# Маркер конца потока пачек
+_DONE = object()
+
+
+@dataclass
+class _Failure:
+    error: BaseException
+
+
+def stream_batches(batches, queue_size: int):
+    """Читает пачки в отдельном потоке, пока вызывающий код пишет предыдущие.
+
+    Очередь ограничена queue_size пачками, поэтому при медленной записи чтение
+    останавливается, и память не растёт с размером таблицы. Первая ошибка чтения
+    пробрасывается читающему; при ошибке записи поток чтения останавливается.
+    """
+    queue = Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
 
+    def reader():
+        try:
+            for batch in batches:
+                if not put(batch):
+                    return
+        except BaseException as error:
+            put(_Failure(error))
+            return
+        finally:
+            batches.close()
+        put(_DONE)
 
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    try:
+        while (item := queue.get()) is not _DONE:
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        thread.join()
 
-def load_from_sqlite(connection: sqlite3.Connection, pg_conn: _connection):
-    """Основной метод загрузки данных из SQLite в Postgres"""
-    sqlite_extractor = SQLiteExtractor(connection)
-    postgres_saver = PostgresSaver(pg_conn)
 
-    args = {
-        'person': PersonModel,
-        'genre': GenreModel,
-        'film_work': FilmworkModel,
-        'person_film_work': PersonFilmworkModel,
-        'genre_film_work': GenreFilmworkModel,
+# Таблицы в порядке последовательной загрузки
+TABLES = {
+    'person': PersonModel,
+    'genre': GenreModel,
+    'film_work': FilmworkModel,
+    'person_film_work': PersonFilmworkModel,
+    'genre_film_work': GenreFilmworkModel,
+}
+
+
+def table_dependencies(tables: dict) -> dict:
+    """Граф зависимостей: для каждой таблицы — таблицы, на которые ссылаются её поля <table>_id"""
+    return {
+        table: {
+            field.name[:-len('_id')]
+            for field in fields(model)
+            if field.name.endswith('_id') and field.name[:-len('_id')] in tables
+        }
+        for table, model in tables.items()
     }
 
-    for table, model in args.items():
-        print(f'{table} -- {model}')
-        data = sqlite_extractor.extract_movies(table, model, is_now=True)
+
+def print_stats(label, stats):
+    """Итог инкрементальной загрузки: вставлено, обновлено и пропущено без изменений"""
+    print(f'{label}: {stats["inserted"]} inserted, {stats["updated"]} updated, {stats["skipped"]} skipped')
+
+
+def load_table(sqlite_extractor, postgres_saver, table, model, settings: LoadSettings, rowid_range=None,
+               checkpoints: Checkpoints = None, changed_since=None):
+    """Переносит одну таблицу (или её диапазон rowid) и фиксирует последнюю транзакцию.
+
+    После каждого коммита позиция сохраняется в checkpoints; если там уже есть
+    позиция (запуск с resume), чтение начинается с неё. С changed_since
+    переносятся только строки, изменённые после этой отметки.
+    """
+    key = Checkpoints.key(table, rowid_range)
+    part = f' rowid [{rowid_range[0]}, {rowid_range[1]})' if rowid_range else ''
+    print(f'{table}{part} -- {model}')
+    started = time.perf_counter()
+    total = 0
+    position = None
+    if checkpoints:
+        position, total = checkpoints.get(key)
+    if position is not None:
+        stop = rowid_range[1] if rowid_range else (sqlite_extractor.bounds(table) or (0, position))[1]
+        print(f'{table}{part}: resuming from rowid {position}, {total} rows already loaded')
+        if position >= stop:
+            return total
+        rowid_range = (position, stop)
+    resumed = total
+    stats = Counter(postgres_saver.stats)
+    metrics = sqlite_extractor.metrics
+    metrics.expect(table, sqlite_extractor.count(table, model, rowid_range, changed_since))
+    sizer = BatchSizer(settings.batch_size, settings.batch_bytes, settings.batch_latency, settings.max_batch_bytes)
+
+    data = sqlite_extractor.extract_movies(table, model, is_now=True, rowid_range=rowid_range,
+                                           changed_since=changed_since, sizer=sizer)
+    if settings.queue_size:
+        data = stream_batches(data, settings.queue_size)
+    with closing(data):
         for rows in data:
-            postgres_saver.save_all_data(table, model, rows)
+            batch_started = time.perf_counter()
+            committed = postgres_saver.save_all_data(table, model, rows)
+            batch_seconds = time.perf_counter() - batch_started
+            metrics.batch(table, len(rows), batch_seconds)
+            sizer.observe_latency(len(rows), batch_seconds)
+            total += len(rows)
+            position = rows.end
+            if committed and checkpoints:
+                checkpoints.save(key, position, total)
+    postgres_saver.commit()
+    if checkpoints and position is not None:
+        checkpoints.save(key, position, total)
+    metrics.finish(table)
+    elapsed = time.perf_counter() - started
+    loaded = total - resumed
+    # скорость выводится для сравнения режимов загрузки между запусками
+    print(f'{table}{part}: {loaded} rows in {elapsed:.2f}s '
+          f'({loaded / elapsed if elapsed else 0:.0f} rows/s, {settings.mode})')
+    # в режиме staging строки попадают в таблицу при слиянии, и счётчики печатает merge_staging
+    if settings.incremental and settings.mode != 'staging':
+        print_stats(f'{table}{part}', postgres_saver.stats - stats)
+    return total
+
+
+def load_from_sqlite(connection: sqlite3.Connection, pg_conn: _connection, settings: LoadSettings = None):
+    """Основной метод загрузки данных из SQLite в Postgres.
+
+    Возвращает для каждой таблицы число строк и время загрузки в секундах.
+    Сводка метрик пишется в settings.metrics_file и settings.prometheus_file,
+    в том числе при ошибке загрузки.
+    """
+    settings = settings or LoadSettings()
+    metrics = Metrics(settings.progress_interval)
+    sqlite_extractor = SQLiteExtractor(connection, metrics)
+    postgres_saver = PostgresSaver(pg_conn, settings, metrics)
+    checkpoints = Checkpoints(settings.state_file, settings.resume) if settings.state_file else None
+    watermarks = Watermarks(settings.watermark_file) if settings.incremental else None
+    timings = {}
+
+    dependencies = table_dependencies(TABLES)
+
+    try:
+        for table, model in TABLES.items():
+            started = time.perf_counter()
+            if settings.mode == 'staging':
+                postgres_saver.prepare_staging(table, keep=settings.resume)
+            changed_since = None
+            if watermarks:
+                # отметка берётся до чтения: строки, изменённые во время загрузки, попадут в следующий запуск
+                mark = sqlite_extractor.high_water_mark(table, model)
+                changed_since = watermarks.get(table)
+            # те же диапазоны, что и у load_parallel, поэтому чекпоинты подходят обоим способам загрузки
+            ranges = [None]
+            if settings.partition_size:
+                ranges = sqlite_extractor.partitions(table, settings.partition_size) or [None]
+            rows = sum(
+                load_table(sqlite_extractor, postgres_saver, table, model, settings, rowid_range, checkpoints,
+                           changed_since)
+                for rowid_range in ranges
+            )
+            if settings.mode == 'staging':
+                postgres_saver.merge_staging(table, model, dependencies[table])
+            # отметка сохраняется только после слияния: иначе строки неудачного слияния следующий запуск пропустит
+            if watermarks:
+                watermarks.save(table, mark)
+            timings[table] = {'rows': rows, 'seconds': time.perf_counter() - started}
+    finally:
+        metrics.write(settings.metrics_file, settings.prometheus_file)
+    return timings
+
+
+def load_parallel(lite_path: str, dsl: dict, settings: LoadSettings):
+    """Загрузка с учётом зависимостей: независимые таблицы идут параллельно,
+    таблицы связей стартуют сразу после коммита своих родителей.
+
+    При partition_size > 0 каждая таблица делится на диапазоны rowid, которые
+    грузятся отдельными задачами пула; таблица считается готовой, когда
+    закоммичены все её диапазоны. Возвращает для каждой таблицы число строк и
+    время от постановки в очередь до коммита последнего диапазона.
+    """
+    dependencies = table_dependencies(TABLES)
+    checkpoints = Checkpoints(settings.state_file, settings.resume) if settings.state_file else None
+    watermarks = Watermarks(settings.watermark_file) if settings.incremental else None
+    metrics = Metrics(settings.progress_interval)
+    marks = {}
+    timings = {}
+    done = set()
+    # таблица -> [число незавершённых диапазонов, всего диапазонов, перенесено строк]
+    progress = {}
+    running = {}
+
+    def worker(table, rowid_range):
+        changed_since = watermarks.get(table) if watermarks else None
+        with conn_context(lite_path, **settings.sqlite_options) as lite_conn, closing(psycopg2.connect(**dsl)) as pg_conn:
+            return load_table(SQLiteExtractor(lite_conn, metrics), PostgresSaver(pg_conn, settings, metrics),
+                              table, TABLES[table], settings, rowid_range, checkpoints, changed_since)
+
+    def plan(table):
+        if settings.mode == 'staging':
+            with closing(psycopg2.connect(**dsl)) as pg_conn:
+                PostgresSaver(pg_conn, settings, metrics).prepare_staging(table, keep=settings.resume)
+        with conn_context(lite_path, **settings.sqlite_options) as lite_conn:
+            extractor = SQLiteExtractor(lite_conn)
+            if watermarks:
+                marks[table] = extractor.high_water_mark(table, TABLES[table])
+            if not settings.partition_size:
+                return [None]
+            return extractor.partitions(table, settings.partition_size) or [None]
+
+    with ThreadPoolExecutor(max_workers=settings.workers) as pool:
+        try:
+            while len(done) < len(TABLES):
+                for table in TABLES:
+                    if table not in progress and dependencies[table] <= done:
+                        timings[table] = {'rows': 0, 'seconds': time.perf_counter()}
+                        ranges = plan(table)
+                        progress[table] = [len(ranges), len(ranges), 0]
+                        for rowid_range in ranges:
+                            running[pool.submit(worker, table, rowid_range)] = table
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    table = running.pop(future)
+                    try:
+                        rows = future.result()
+                    except Exception:
+                        # остальные задачи дорабатывают текущий диапазон, новые не запускаются
+                        for pending in running:
+                            pending.cancel()
+                        raise
+                    state = progress[table]
+                    state[0] -= 1
+                    state[2] += rows
+                    if state[1] > 1:
+                        print(f'{table}: {state[1] - state[0]}/{state[1]} partitions, {state[2]} rows')
+                    if not state[0]:
+                        if settings.mode == 'staging':
+                            with closing(psycopg2.connect(**dsl)) as pg_conn:
+                                PostgresSaver(pg_conn, settings, metrics).merge_staging(
+                                    table, TABLES[table], dependencies[table])
+                        done.add(table)
+                        timings[table] = {'rows': state[2], 'seconds': time.perf_counter() - timings[table]['seconds']}
+                        if watermarks:
+                            watermarks.save(table, marks[table])
+        finally:
+            metrics.write(settings.metrics_file, settings.prometheus_file)
+    return timings
+
+
+@lru_cache(maxsize=65536)
+def convert_timestamp(value: bytes) -> datetime:
+    return parse_timestamp(value.decode())
+
+
+@lru_cache(maxsize=65536)
+def convert_date(value: bytes) -> date:
+    return parse_date(value.decode())
 
 
 @contextmanager
-def conn_context(db_path: str):
-    sqlite3.register_converter(
-        "timestamp",
-        lambda x: datetime.fromisoformat(x.decode() + ':00')
-    )
+def conn_context(db_path: str, parse_types: bool = True, read_only: bool = False,
+                 mmap_size: int = 0, cache_size: int = 0):
+    """Соединение с SQLite.
 
-    conn = sqlite3.connect(db_path, detect_types=sqlite3.PARSE_DECLTYPES)
+    С parse_types отметки времени и даты разбираются в datetime/date
+    (с кэшем для повторяющихся значений); без него остаются текстом, который
+    загрузчик после проверки формата передаёт в Postgres как есть.
+    С read_only база открывается по URI в режиме ro с query_only, временные
+    структуры держатся в памяти, а файл читается через mmap размером mmap_size
+    байт с кэшем страниц в cache_size байт.
+    """
+    sqlite3.register_converter("timestamp", convert_timestamp)
+    sqlite3.register_converter("date", convert_date)
+
+    detect_types = sqlite3.PARSE_DECLTYPES if parse_types else 0
+    # соединение читается из потока stream_batches, а не из создавшего его потока
+    if read_only:
+        conn = sqlite3.connect(f'{pathlib.Path(db_path).resolve().as_uri()}?mode=ro', uri=True,
+                               detect_types=detect_types, check_same_thread=False)
+        conn.execute('PRAGMA query_only = ON;')
+        conn.execute('PRAGMA temp_store = MEMORY;')
+        conn.execute(f'PRAGMA mmap_size = {int(mmap_size)};')
+        # отрицательное значение cache_size задаётся в килобайтах, а не в страницах;
+        # меньше килобайта — кэш SQLite по умолчанию, а не «-0», то есть кэш из 0 страниц
+        if cache_kib := int(cache_size) // 1024:
+            conn.execute(f'PRAGMA cache_size = -{cache_kib};')
+    else:
+        conn = sqlite3.connect(db_path, detect_types=detect_types, check_same_thread=False)
     conn.row_factory = sqlite3.Row
     yield conn
     conn.close()
 
 
+@contextmanager
+def source_snapshot(db_path: str, snapshot_dir: str = ''):
+    """Путь к SQLite-базе, из которой читать загрузку.
+
+    С snapshot_dir база целиком копируется туда через backup API в одной
+    читающей транзакции: загрузка идёт по согласованной копии, а исходная база
+    остаётся доступной приложению. Копия удаляется после загрузки.
+    """
+    if not snapshot_dir:
+        yield db_path
+        return
+    os.makedirs(snapshot_dir, exist_ok=True)
+    path = os.path.join(snapshot_dir, f'{os.path.basename(db_path)}.snapshot')
+    started = time.perf_counter()
+    with closing(sqlite3.connect(f'{pathlib.Path(db_path).resolve().as_uri()}?mode=ro', uri=True)) as source, \
+            closing(sqlite3.connect(path)) as target:
+        source.backup(target)
+    print(f'snapshot {path}: {os.path.getsize(path)} bytes in {time.perf_counter() - started:.1f}s')
+    try:
+        yield path
+    finally:
+        os.remove(path)
+
+
 if __name__ == '__main__':
     lite_path = os.environ.get("DB_NAME_LITE")
     pg_db = os.environ.get("DB_NAME_PG")
@@ -153,6 +1107,75 @@ if __name__ == '__main__':
 
     dsl = {'dbname': pg_db, 'user': usr, 'password': pwd, 'host': host, 'port': port}
 
-    with conn_context(lite_path) as lite_conn, closing(psycopg2.connect(**dsl, cursor_factory=DictCursor)) as pgre_conn:
-        load_from_sqlite(lite_conn, pgre_conn)
+    parser = argparse.ArgumentParser(description='Перенос данных из SQLite в Postgres')
+    parser.add_argument('--mode', choices=LOAD_MODES, default=os.environ.get('LOAD_MODE', 'insert'),
+                        help='способ записи в Postgres (по умолчанию LOAD_MODE или insert)')
+    parser.add_argument('--page-size', type=int, default=int(os.environ.get('LOAD_PAGE_SIZE', 1000)),
+                        help='строк в одном INSERT режима values')
+    parser.add_argument('--commit', default=os.environ.get('LOAD_COMMIT', 'batch'),
+                        help='граница транзакции: batch, table или число строк')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('LOAD_WORKERS', 1)),
+                        help='число параллельных потоков загрузки')
+    parser.add_argument('--queue-size', type=int, default=int(os.environ.get('LOAD_QUEUE_SIZE', 4)),
+                        help='сколько пачек чтение может опережать запись (0 — без перекрытия)')
+    parser.add_argument('--partition-size', type=int, default=int(os.environ.get('LOAD_PARTITION_SIZE', 0)),
+                        help='ширина диапазонов rowid, на которые делится таблица (0 — не делить)')
+    parser.add_argument('--state-file', default=os.environ.get('LOAD_STATE_FILE', 'load_state.json'),
+                        help='файл контрольных точек (пустая строка — не сохранять)')
+    parser.add_argument('--resume', action='store_true',
+                        help='продолжить с последних контрольных точек')
+    parser.add_argument('--incremental', action='store_true',
+                        default=os.environ.get('LOAD_INCREMENTAL', 'False') == 'True',
+                        help='переносить только строки, изменённые после прошлого запуска')
+    parser.add_argument('--watermark-file', default=os.environ.get('LOAD_WATERMARK_FILE', 'sync_state.json'),
+                        help='файл с отметками инкрементальной синхронизации')
+    parser.add_argument('--batch-size', type=int, default=int(os.environ.get('LOAD_BATCH_SIZE', 0)),
+                        help='фиксированный размер пачки в строках (0 — подбирать автоматически)')
+    parser.add_argument('--batch-bytes', type=int, default=int(os.environ.get('LOAD_BATCH_BYTES', 4 * 2 ** 20)),
+                        help='целевой объём пачки в байтах')
+    parser.add_argument('--batch-latency', type=float, default=float(os.environ.get('LOAD_BATCH_LATENCY', 0.5)),
+                        help='целевое время записи пачки в секундах')
+    parser.add_argument('--max-batch-bytes', type=int,
+                        default=int(os.environ.get('LOAD_MAX_BATCH_BYTES', 64 * 2 ** 20)),
+                        help='предел объёма пачки в байтах')
+    parser.add_argument('--parse-types', action='store_true',
+                        help='разбирать отметки времени и даты SQLite вместо передачи текста в Postgres')
+    parser.add_argument('--rebuild-indexes', action='store_true',
+                        help='режим staging: перестроить индексы и внешние ключи после загрузки в пустую таблицу')
+    parser.add_argument('--read-only', action='store_true',
+                        default=os.environ.get('LOAD_READ_ONLY', 'False') == 'True',
+                        help='открыть SQLite только на чтение с настройками под последовательный проход')
+    parser.add_argument('--mmap-size', type=int, default=int(os.environ.get('LOAD_MMAP_SIZE', 256 * 2 ** 20)),
+                        help='размер mmap для SQLite в байтах при --read-only (0 — без mmap)')
+    parser.add_argument('--cache-size', type=int, default=int(os.environ.get('LOAD_CACHE_SIZE', 64 * 2 ** 20)),
+                        help='кэш страниц SQLite в байтах при --read-only (меньше 1024 — по умолчанию SQLite)')
+    parser.add_argument('--snapshot-dir', default=os.environ.get('LOAD_SNAPSHOT_DIR', ''),
+                        help='каталог для копии SQLite-базы, из которой идёт загрузка (пустая строка — без копии)')
+    parser.add_argument('--metrics-file', default=os.environ.get('LOAD_METRICS_FILE', 'load_metrics.json'),
+                        help='JSON-сводка метрик (пустая строка — не писать)')
+    parser.add_argument('--prometheus-file', default=os.environ.get('LOAD_PROMETHEUS_FILE', ''),
+                        help='textfile Prometheus с метриками')
+    parser.add_argument('--progress-interval', type=float,
+                        default=float(os.environ.get('LOAD_PROGRESS_INTERVAL', 5)),
+                        help='период вывода прогресса в секундах (0 — не выводить)')
+    cli = parser.parse_args()
+    settings = LoadSettings(mode=cli.mode, page_size=cli.page_size, commit=cli.commit, workers=cli.workers,
+                            queue_size=cli.queue_size, partition_size=cli.partition_size,
+                            state_file=cli.state_file, resume=cli.resume,
+                            incremental=cli.incremental, watermark_file=cli.watermark_file,
+                            rebuild_indexes=cli.rebuild_indexes, parse_types=cli.parse_types,
+                            batch_size=cli.batch_size, batch_bytes=cli.batch_bytes,
+                            batch_latency=cli.batch_latency, max_batch_bytes=cli.max_batch_bytes,
+                            read_only=cli.read_only, mmap_size=cli.mmap_size, cache_size=cli.cache_size,
+                            snapshot_dir=cli.snapshot_dir,
+                            metrics_file=cli.metrics_file, prometheus_file=cli.prometheus_file,
+                            progress_interval=cli.progress_interval)
+
+    with source_snapshot(lite_path, settings.snapshot_dir) as source_path:
+        if settings.workers > 1:
+            load_parallel(source_path, dsl, settings)
+        else:
+            with conn_context(source_path, **settings.sqlite_options) as lite_conn, \
+                    closing(psycopg2.connect(**dsl, cursor_factory=DictCursor)) as pgre_conn:
+                load_from_sqlite(lite_conn, pgre_conn, settings)
 
@@ -0,0 +1,185 @@
+"""Метрики переноса SQLite -> Postgres: время по стадиям, скорость, гистограмма
+задержек записи пачек, пиковая память и прогресс с оценкой оставшегося времени."""
+import os
+import sys
+import json
+import time
+import resource
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+# Границы корзин гистограммы задержки записи одной пачки, в секундах
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Стадии: чтение из SQLite, преобразование строк, запись в Postgres, коммит
+STAGES = ('extract', 'transform', 'load', 'commit')
+
+
+def peak_rss_bytes() -> int:
+    # на Linux ru_maxrss в килобайтах, на macOS — в байтах
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+@dataclass
+class TableMetrics:
+    rows: int = 0
+    # ожидаемое число строк по COUNT(*) для оценки оставшегося времени
+    expected: int = 0
+    batches: int = 0
+    started: float = None
+    finished: float = None
+    stages: Counter = field(default_factory=Counter)
+    # число пачек в каждой корзине BUCKETS, последняя — больше BUCKETS[-1]
+    histogram: list = field(default_factory=lambda: [0] * (len(BUCKETS) + 1))
+    batch_seconds: float = 0.0
+
+
+class Metrics:
+    """Потокобезопасный сборщик метрик одного запуска загрузки.
+
+    Стадии меряются по настенному времени; при перекрытии чтения и записи
+    (stream_batches) и параллельной загрузке суммы стадий могут превышать
+    общее время запуска.
+    """
+
+    def __init__(self, progress_interval: float = 5.0, stream=None):
+        self.progress_interval = progress_interval
+        self.stream = stream
+        self.tables = {}
+        self.started = time.perf_counter()
+        self._last_progress = self.started
+        self._lock = threading.Lock()
+
+    def _table(self, table) -> TableMetrics:
+        if table not in self.tables:
+            self.tables[table] = TableMetrics(started=time.perf_counter())
+        return self.tables[table]
+
+    @contextmanager
+    def timer(self, table, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._table(table).stages[stage] += elapsed
+
+    def expect(self, table, rows):
+        with self._lock:
+            self._table(table).expected += rows
+
+    def batch(self, table, rows, seconds):
+        """Учитывает записанную пачку и при необходимости печатает прогресс"""
+        bucket = next((n for n, bound in enumerate(BUCKETS) if seconds <= bound), len(BUCKETS))
+        with self._lock:
+            metrics = self._table(table)
+            metrics.rows += rows
+            metrics.batches += 1
+            metrics.batch_seconds += seconds
+            metrics.histogram[bucket] += 1
+
+            now = time.perf_counter()
+            if self.progress_interval and now - self._last_progress >= self.progress_interval:
+                self._last_progress = now
+                print(self._progress_line(table, now), file=self.stream or sys.stdout, flush=True)
+
+    def finish(self, table):
+        with self._lock:
+            self._table(table).finished = time.perf_counter()
+
+    def _progress_line(self, table, now):
+        metrics = self.tables[table]
+        rate = metrics.rows / (now - metrics.started) if now > metrics.started else 0
+        line = f'{table}: {metrics.rows}/{metrics.expected} rows'
+        if metrics.expected:
+            line += f' ({100 * metrics.rows / metrics.expected:.1f}%)'
+        line += f', {rate:.0f} rows/s'
+        if rate and metrics.expected > metrics.rows:
+            line += f', ETA {(metrics.expected - metrics.rows) / rate:.0f}s'
+
+        total_rows = sum(item.rows for item in self.tables.values())
+        total_expected = sum(item.expected for item in self.tables.values())
+        total_rate = total_rows / (now - self.started)
+        line += f' | total {total_rows}/{total_expected}'
+        if total_rate and total_expected > total_rows:
+            line += f', ETA {(total_expected - total_rows) / total_rate:.0f}s'
+        return f'{line} | peak RSS {peak_rss_bytes() / 2 ** 20:.0f} MB'
+
+    def summary(self) -> dict:
+        """Машиночитаемая сводка запуска"""
+        now = time.perf_counter()
+        with self._lock:
+            tables = {}
+            for table, metrics in self.tables.items():
+                seconds = (metrics.finished or now) - metrics.started
+                tables[table] = {
+                    'rows': metrics.rows,
+                    'expected_rows': metrics.expected,
+                    'batches': metrics.batches,
+                    'seconds': seconds,
+                    'rows_per_sec': metrics.rows / seconds if seconds else None,
+                    'stage_seconds': {stage: metrics.stages[stage] for stage in STAGES},
+                    'batch_seconds': {
+                        'sum': metrics.batch_seconds,
+                        'count': metrics.batches,
+                        'buckets': dict(zip([*map(str, BUCKETS), '+Inf'], metrics.histogram)),
+                    },
+                }
+            seconds = now - self.started
+            rows = sum(item['rows'] for item in tables.values())
+            return {
+                'rows': rows,
+                'seconds': seconds,
+                'rows_per_sec': rows / seconds if seconds else None,
+                'peak_rss_bytes': peak_rss_bytes(),
+                'tables': tables,
+            }
+
+    def prometheus(self) -> str:
+        """Сводка в текстовом формате Prometheus (для node_exporter textfile collector)"""
+        summary = self.summary()
+        lines = [
+            '# HELP loader_rows_total Rows written to Postgres.',
+            '# TYPE loader_rows_total counter',
+            *(f'loader_rows_total{{table="{table}"}} {item["rows"]}' for table, item in summary['tables'].items()),
+            '# HELP loader_stage_seconds_total Time spent per loader stage.',
+            '# TYPE loader_stage_seconds_total counter',
+            *(
+                f'loader_stage_seconds_total{{table="{table}",stage="{stage}"}} {seconds:.6f}'
+                for table, item in summary['tables'].items()
+                for stage, seconds in item['stage_seconds'].items()
+            ),
+            '# HELP loader_batch_seconds Latency of writing one batch to Postgres.',
+            '# TYPE loader_batch_seconds histogram',
+        ]
+        for table, item in summary['tables'].items():
+            cumulative = 0
+            for bound, count in item['batch_seconds']['buckets'].items():
+                cumulative += count
+                lines.append(f'loader_batch_seconds_bucket{{table="{table}",le="{bound}"}} {cumulative}')
+            lines.append(f'loader_batch_seconds_sum{{table="{table}"}} {item["batch_seconds"]["sum"]:.6f}')
+            lines.append(f'loader_batch_seconds_count{{table="{table}"}} {item["batch_seconds"]["count"]}')
+        lines += [
+            '# HELP loader_peak_rss_bytes Peak resident set size of the loader process.',
+            '# TYPE loader_peak_rss_bytes gauge',
+            f'loader_peak_rss_bytes {summary["peak_rss_bytes"]}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def write(self, json_path: str = None, prometheus_path: str = None):
+        """Записывает сводку в JSON и, если задан путь, в textfile Prometheus"""
+        if json_path:
+            _write_atomic(json_path, json.dumps(self.summary(), indent=2))
+        if prometheus_path:
+            _write_atomic(prometheus_path, self.prometheus())
+
+
+def _write_atomic(path, text):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as output:
+        output.write(text)
+    os.replace(tmp_path, path)
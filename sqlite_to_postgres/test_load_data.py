@@ -1,32 +1,39 @@
+import json
+import sqlite3
+
 import pytest
 
-from load_data import FilmworkModel, GenreModel, PersonModel, PersonFilmworkModel, GenreFilmworkModel
-from dataclasses import fields
+from load_data import GenreModel, PersonModel, copy_value
+from load_data import LoadSettings, TABLES, table_dependencies, stream_batches, SQLiteExtractor
+from load_data import as_rows, columns, load_table, Checkpoints, PostgresSaver, conn_context, BatchSizer
+from load_data import load_from_sqlite, source_snapshot, StagingIntegrityError
+from metrics import Metrics
+from collections import Counter
+from contextlib import closing
+from datetime import date, datetime, timezone
+
+GENRE_ID = '3d8d9bf5-0d90-4353-88ba-4ccc5d2c07ff'
+CREATED = '2021-06-16 20:14:09.221838+00'
+UPDATED = '2021-06-16 20:14:09.221855+00'
+
+
+def genre_id(n):
+    return f'00000000-0000-0000-0000-{n:012}'
 
 
 @pytest.mark.parametrize(
-    'table, class_name',
+    'table',
     (
-        ('person', PersonModel),
-        ('genre', GenreModel),
-        ('film_work', FilmworkModel),
-        ('person_film_work', PersonFilmworkModel),
-        ('genre_film_work', GenreFilmworkModel),
+        'person',
+        'genre',
+        'film_work',
+        'person_film_work',
+        'genre_film_work',
     ),
 )
-def test_every_row(lite_conn, pg_conn, table, class_name):
-    # with lite_conn as litesql_connection:
-    lite_curs = lite_conn.cursor()
-    lite_curs.execute(f'SELECT * FROM {table};')
-    while lite_row := lite_curs.fetchone():
-        lite_model = class_name(**lite_row)
-
-        with pg_conn.cursor() as pg_curs:
-            field_names = ', '.join([field.name for field in fields(class_name)])
-            pg_curs.execute(f'SELECT {field_names} FROM content.{table} WHERE id=\'{lite_model.id}\';')
-            pg_row = pg_curs.fetchone()
-            postgre_model = class_name(**pg_row)
-            assert lite_model == postgre_model
+def test_every_row(verification, table):
+    report = verification[table]
+    assert report.ok, str(report)
 
 
 @pytest.mark.parametrize(
@@ -54,5 +61,328 @@ def test_row_counts(lite_conn, pg_conn, table):
     assert lite_count == pg_count
 
 
+@pytest.mark.parametrize(
+    'value, expected',
+    (
+        (None, '\\N'),
+        ('plain', 'plain'),
+        ('tab\there', 'tab\\there'),
+        ('line\nbreak\r', 'line\\nbreak\\r'),
+        ('back\\slash', 'back\\\\slash'),
+        (date(2021, 6, 16), '2021-06-16'),
+        (7.5, '7.5'),
+    ),
+)
+def test_copy_value(value, expected):
+    assert copy_value(value) == expected
+
+
+def test_sequential_partitions(load_env, pg_conn, tmp_path):
+    state_file = tmp_path / 'state.json'
+    settings = LoadSettings(mode='copy', partition_size=5000, state_file=str(state_file), metrics_file='')
+    with conn_context(load_env['lite_db_path'], parse_types=False) as lite_conn:
+        load_from_sqlite(lite_conn, pg_conn, settings)
+        ranges = SQLiteExtractor(lite_conn).partitions('person_film_work', 5000)
+
+    # с одним потоком диапазоны те же, что и у load_parallel, и у каждого своя контрольная точка
+    state = json.loads(state_file.read_text())
+    assert len(ranges) > 1
+    assert {key for key in state if key.startswith('person_film_work:')} == {
+        Checkpoints.key('person_film_work', rowid_range) for rowid_range in ranges
+    }
+
+
+def test_staging_null_roles(pg_conn):
+    saver = PostgresSaver(pg_conn)
+    saver.prepare_staging('person_film_work')
+    staging = saver.staging_table('person_film_work')
+    try:
+        with pg_conn.cursor() as curs:
+            curs.execute('SELECT film_work_id, person_id FROM content.person_film_work LIMIT 1;')
+            film_work_id, person_id = curs.fetchone()
+            # в DDL role NOT NULL, а в схеме миграций Django колонка допускает NULL
+            curs.execute(f'ALTER TABLE {staging} ALTER COLUMN role DROP NOT NULL;')
+            for role in (None, None, 'director', 'director'):
+                curs.execute(f"""
+                    INSERT INTO {staging} (id, film_work_id, person_id, role, created_at)
+                    VALUES (gen_random_uuid(), %s, %s, %s, now());
+                """, (film_work_id, person_id, role))
+            # в уникальном индексе (film_work_id, person_id, role) строки с NULL в role не совпадают
+            problems = saver.check_staging(curs, 'person_film_work', ('film_work', 'person'))
+        assert '1 duplicate (film_work_id, person_id, role) values' in problems
+    finally:
+        # prepare_staging фиксирует создание таблицы, откат её не удаляет
+        pg_conn.rollback()
+        with pg_conn.cursor() as curs:
+            curs.execute(f'DROP TABLE IF EXISTS {staging};')
+        pg_conn.commit()
+
+
+def incremental_staging(load_env, tmp_path):
+    """Копия исходной базы и настройки инкрементальной загрузки через staging"""
+    source = str(tmp_path / 'source.db')
+    with closing(sqlite3.connect(load_env['lite_db_path'])) as conn, closing(sqlite3.connect(source)) as copy:
+        conn.backup(copy)
+    settings = LoadSettings(mode='staging', incremental=True, watermark_file=str(tmp_path / 'sync.json'),
+                            state_file='', metrics_file='')
+    return source, settings
+
+
+def test_staging_incremental_stats(load_env, pg_conn, tmp_path, capsys):
+    source, settings = incremental_staging(load_env, tmp_path)
+    with conn_context(source, parse_types=False) as lite_conn:
+        genres = lite_conn.execute('SELECT COUNT(*) FROM genre;').fetchone()[0]
+        load_from_sqlite(lite_conn, pg_conn, settings)
+
+    # счётчики печатаются после слияния, а не до него нулями
+    output = capsys.readouterr().out
+    assert f'genre: 0 inserted, 0 updated, {genres} skipped' in output
+    assert '0 inserted, 0 updated, 0 skipped' not in output
+
+
+def test_failed_merge_keeps_watermark(load_env, pg_conn, tmp_path):
+    source, settings = incremental_staging(load_env, tmp_path)
+    with closing(sqlite3.connect(source)) as conn:
+        row = conn.execute('SELECT film_work_id, person_id FROM person_film_work LIMIT 1;').fetchone()
+        conn.execute("INSERT INTO person_film_work VALUES (?, ?, ?, 'actor', '2030-01-01 00:00:00+00');",
+                     ('00000000-0000-0000-0000-000000000001', '00000000-0000-0000-0000-000000000002', row[1]))
+        conn.commit()
+
+    try:
+        with conn_context(source, parse_types=False) as lite_conn, pytest.raises(StagingIntegrityError):
+            load_from_sqlite(lite_conn, pg_conn, settings)
+    finally:
+        with pg_conn.cursor() as curs:
+            curs.execute('DROP TABLE IF EXISTS content.person_film_work_staging;')
+        pg_conn.commit()
+
+    # строки неудачного слияния должны попасть в следующий запуск
+    watermarks = json.loads((tmp_path / 'sync.json').read_text())
+    assert 'person' in watermarks
+    assert 'person_film_work' not in watermarks
+
+
+def test_commit_policy():
+    assert LoadSettings(commit='batch').commit_rows is None
+    assert LoadSettings(commit='table').commit_rows is None
+    assert LoadSettings(commit='5000').commit_rows == 5000
+
+    with pytest.raises(ValueError):
+        LoadSettings(commit='never')
+    with pytest.raises(ValueError):
+        LoadSettings(mode='values', page_size=0)
+
+
+def test_table_dependencies():
+    assert table_dependencies(TABLES) == {
+        'person': set(),
+        'genre': set(),
+        'film_work': set(),
+        'person_film_work': {'film_work', 'person'},
+        'genre_film_work': {'film_work', 'genre'},
+    }
+
+
+def test_stream_batches():
+    batches = (list(range(n)) for n in range(10))
+    assert list(stream_batches(batches, queue_size=2)) == [list(range(n)) for n in range(10)]
+
+    def broken():
+        yield [1]
+        raise RuntimeError('read failed')
+
+    with pytest.raises(RuntimeError, match='read failed'):
+        list(stream_batches(broken(), queue_size=1))
+
+
+def test_partitions_cover_table():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE genre (id TEXT);')
+    conn.executemany('INSERT INTO genre VALUES (?);', [(str(n),) for n in range(25)])
+    conn.execute('DELETE FROM genre WHERE rowid IN (3, 17);')
+    extractor = SQLiteExtractor(conn)
+
+    ranges = extractor.partitions('genre', 10)
+    assert ranges == [(1, 11), (11, 21), (21, 26)]
+
+    counted = sum(
+        conn.execute('SELECT COUNT(*) FROM genre WHERE rowid >= ? AND rowid < ?;', rowid_range).fetchone()[0]
+        for rowid_range in ranges
+    )
+    assert counted == 23
+    assert SQLiteExtractor(sqlite3.connect(':memory:')).partitions('sqlite_master', 10) == []
+
+
+def test_rows_follow_model_columns():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE genre (id TEXT, name TEXT, description TEXT, created_at TEXT, updated_at TEXT);')
+    conn.execute(f"INSERT INTO genre VALUES ('{GENRE_ID}', 'Drama', NULL, '{CREATED}', '{UPDATED}');")
+    extractor = SQLiteExtractor(conn)
+
+    [rows] = extractor.extract_movies('genre', GenreModel)
+    assert columns(GenreModel) == ('updated_at', 'id', 'created_at', 'name', 'description')
+    assert rows == [(UPDATED, GENRE_ID, CREATED, 'Drama', None)]
+
+    [models] = extractor.extract_movies('genre', GenreModel, as_models=True)
+    assert models == [GenreModel(id=GENRE_ID, name='Drama', description=None, created_at=CREATED, updated_at=UPDATED)]
+    assert as_rows(GenreModel, models) == rows
+
+
+class ListSaver:
+    def __init__(self):
+        self.rows = []
+        self.stats = Counter()
+
+    def save_all_data(self, table, model, rows):
+        self.rows.extend(rows)
+        return True
+
+    def commit(self):
+        pass
+
+
+def test_resume_from_checkpoint(tmp_path):
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE genre (id TEXT, name TEXT, description TEXT, created_at TEXT, updated_at TEXT);')
+    conn.executemany('INSERT INTO genre (rowid, id) VALUES (?, ?);', [(n, genre_id(n)) for n in (*range(1, 251), 10 ** 6)])
+    extractor = SQLiteExtractor(conn)
+    settings = LoadSettings(queue_size=0)
+    state_file = str(tmp_path / 'state.json')
+
+    checkpoints = Checkpoints(state_file)
+    checkpoints.save('genre', 101, 100)
+    saver = ListSaver()
+    assert load_table(extractor, saver, 'genre', GenreModel, settings, checkpoints=Checkpoints(state_file, True)) == 251
+    assert [row[1] for row in saver.rows] == [genre_id(n) for n in (*range(101, 251), 10 ** 6)]
+    assert Checkpoints(state_file, resume=True).get('genre') == (10 ** 6 + 1, 251)
+
+    saver = ListSaver()
+    assert load_table(extractor, saver, 'genre', GenreModel, settings, checkpoints=Checkpoints(state_file, True)) == 251
+    assert saver.rows == []
+
+
+def test_incremental_extraction():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE genre (id TEXT, name TEXT, description TEXT, created_at TEXT, updated_at TEXT);')
+    conn.executemany(
+        'INSERT INTO genre (id, updated_at) VALUES (?, ?);',
+        [(genre_id(n), f'2021-06-{n:02} 00:00:00+00') for n in range(1, 31)],
+    )
+    extractor = SQLiteExtractor(conn)
+
+    assert extractor.high_water_mark('genre', GenreModel) == '2021-06-30 00:00:00+00'
+    batches = list(extractor.extract_movies('genre', GenreModel, batch_size=7, changed_since='2021-06-27 00:00:00+00'))
+    assert [row[1] for batch in batches for row in batch] == [genre_id(28), genre_id(29), genre_id(30)]
+
+
+def test_incremental_upsert_clause():
+    saver = PostgresSaver(None, LoadSettings(incremental=True))
+    clause = saver.on_conflict(PersonModel)
+    assert clause.startswith('ON CONFLICT (id) DO UPDATE SET updated_at = EXCLUDED.updated_at, ')
+    assert 'WHERE (target.updated_at, target.created_at, target.full_name) IS DISTINCT FROM' in clause
+    assert clause.endswith('RETURNING (xmax = 0)')
+    assert PostgresSaver(None).on_conflict(PersonModel) == 'ON CONFLICT (id) DO NOTHING'
+
+
+def test_metrics_summary(tmp_path):
+    metrics = Metrics(progress_interval=0)
+    metrics.expect('genre', 3)
+    with metrics.timer('genre', 'load'):
+        pass
+    metrics.batch('genre', 2, 0.003)
+    metrics.batch('genre', 1, 20)
+    metrics.finish('genre')
+
+    summary = metrics.summary()['tables']['genre']
+    assert (summary['rows'], summary['expected_rows'], summary['batches']) == (3, 3, 2)
+    assert summary['batch_seconds']['buckets']['0.005'] == 1
+    assert summary['batch_seconds']['buckets']['+Inf'] == 1
+
+    metrics.write(str(tmp_path / 'summary.json'), str(tmp_path / 'loader.prom'))
+    prometheus = (tmp_path / 'loader.prom').read_text()
+    assert 'loader_rows_total{table="genre"} 3' in prometheus
+    assert 'loader_batch_seconds_bucket{table="genre",le="+Inf"} 2' in prometheus
+
+
+def test_text_passthrough_and_conversion():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE genre (id TEXT, name TEXT, description TEXT, created_at TEXT, updated_at TEXT);')
+    # created_at в другом формате: колонка разбирается, остальные уходят текстом как есть
+    conn.execute(f"INSERT INTO genre VALUES ('{GENRE_ID.upper()}', 'Drama', NULL, '2021-06-16T20:14:09', '{UPDATED}');")
+
+    [rows] = SQLiteExtractor(conn).extract_movies('genre', GenreModel)
+    updated_at, row_id, created_at, _, _ = rows[0]
+    assert updated_at == UPDATED
+    assert row_id == GENRE_ID.upper()
+    assert created_at == datetime(2021, 6, 16, 20, 14, 9)
+
+
+def test_parsed_timestamps(tmp_path):
+    path = str(tmp_path / 'source.db')
+    with closing(sqlite3.connect(path)) as conn:
+        conn.execute('CREATE TABLE genre (created_at timestamp with time zone, creation_date DATE);')
+        conn.execute(f"INSERT INTO genre VALUES ('{CREATED}', '2021-06-16');")
+        conn.commit()
+
+    with conn_context(path) as conn:
+        assert tuple(conn.execute('SELECT * FROM genre;').fetchone()) == (
+            datetime(2021, 6, 16, 20, 14, 9, 221838, tzinfo=timezone.utc), date(2021, 6, 16),
+        )
+    with conn_context(path, parse_types=False) as conn:
+        assert tuple(conn.execute('SELECT * FROM genre;').fetchone()) == (CREATED, '2021-06-16')
+
+
+def test_batch_sizer():
+    narrow = [('x' * 100,)] * 20
+    sizer = BatchSizer(target_bytes=100_000, target_latency=1.0, max_bytes=10 ** 6)
+    for _ in range(20):
+        sizer.observe_rows(narrow)
+    assert sizer.size == 1000
+
+    # медленная запись уменьшает пачку, но не больше чем вдвое за шаг
+    sizer.observe_latency(1000, 10.0)
+    assert sizer.size == 500
+
+    wide = [('x' * 10 ** 6,)] * 2
+    capped = BatchSizer(fixed=5000, max_bytes=4 * 10 ** 6)
+    capped.observe_rows(wide)
+    assert capped.size == 4
+    assert BatchSizer(fixed=5000).size == 5000
+
+
+def test_batch_sizer_caps_first_batch():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE genre (id TEXT, name TEXT, description TEXT, created_at TEXT, updated_at TEXT);')
+    conn.executemany('INSERT INTO genre (id, description) VALUES (?, ?);',
+                     [(genre_id(n), 'x' * 10 ** 5) for n in range(50)])
+    sizer = BatchSizer(fixed=5000, max_bytes=10 ** 6)
+
+    batches = SQLiteExtractor(conn).extract_movies('genre', GenreModel, sizer=sizer)
+    assert len(next(batches)) < 10
+
+
+def test_read_only_source(tmp_path):
+    path = str(tmp_path / 'source.db')
+    with closing(sqlite3.connect(path)) as conn:
+        conn.execute('CREATE TABLE genre (id TEXT);')
+        conn.execute(f"INSERT INTO genre VALUES ('{GENRE_ID}');")
+        conn.commit()
+
+    with source_snapshot(path, str(tmp_path / 'snapshots')) as snapshot:
+        assert snapshot != path
+        with conn_context(snapshot, **LoadSettings(read_only=True, cache_size=2 ** 20).sqlite_options) as conn:
+            assert conn.execute('PRAGMA query_only;').fetchone()[0] == 1
+            assert conn.execute('PRAGMA cache_size;').fetchone()[0] == -1024
+            assert conn.execute('SELECT id FROM genre;').fetchone()[0] == GENRE_ID
+            with pytest.raises(sqlite3.OperationalError):
+                conn.execute('DELETE FROM genre;')
+    assert not (tmp_path / 'snapshots' / 'source.db.snapshot').exists()
+
+    with closing(sqlite3.connect(':memory:')) as conn:
+        default = conn.execute('PRAGMA cache_size;').fetchone()[0]
+    with conn_context(path, **LoadSettings(read_only=True, cache_size=100).sqlite_options) as conn:
+        assert conn.execute('PRAGMA cache_size;').fetchone()[0] == default
+
+
 if __name__ == '__main__':
     pytest.main()
@@ -0,0 +1,70 @@
+import sqlite3
+
+import pytest
+
+from load_data import GenreModel
+from verify_data import verify_table
+
+
+class SQLitePostgres:
+    """Postgres-подобное соединение поверх SQLite со схемой content"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def cursor(self, name=None):
+        return NamedCursor(self.conn.cursor())
+
+    def commit(self):
+        pass
+
+
+class NamedCursor:
+    def __init__(self, curs):
+        self.curs = curs
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.curs.close()
+
+    def execute(self, query):
+        self.curs.execute(query)
+
+    def __iter__(self):
+        return iter(self.curs)
+
+
+@pytest.fixture
+def databases():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("ATTACH DATABASE ':memory:' AS content;")
+    for schema in ('main', 'content'):
+        conn.execute(f'CREATE TABLE {schema}.genre (id TEXT, name TEXT, description TEXT, '
+                     f'created_at TEXT, updated_at TEXT);')
+        conn.executemany(
+            f'INSERT INTO {schema}.genre (id, name) VALUES (?, ?);',
+            [(f'00000000-0000-0000-0000-{n:012}', f'genre {n}') for n in range(50)],
+        )
+    return conn
+
+
+def test_identical_tables(databases):
+    report = verify_table(databases, SQLitePostgres(databases), 'genre', GenreModel, chunk_size=7)
+    assert report.ok
+    assert (report.source_rows, report.target_rows, report.chunks, report.mismatched_chunks) == (50, 50, 8, 0)
+
+
+def test_differences_are_reported(databases):
+    databases.execute("DELETE FROM content.genre WHERE id = '00000000-0000-0000-0000-000000000003';")
+    databases.execute("UPDATE content.genre SET name = 'changed' WHERE id = '00000000-0000-0000-0000-000000000020';")
+    databases.execute("INSERT INTO content.genre (id, name) VALUES ('00000000-0000-0000-0000-00000000003a', 'new');")
+    databases.execute("INSERT INTO content.genre (id, name) VALUES ('ffffffff-0000-0000-0000-000000000000', 'tail');")
+
+    report = verify_table(databases, SQLitePostgres(databases), 'genre', GenreModel, chunk_size=10)
+    assert report.missing == ['00000000-0000-0000-0000-000000000003']
+    assert report.mismatched == ['00000000-0000-0000-0000-000000000020']
+    assert report.extra == ['00000000-0000-0000-0000-00000000003a', 'ffffffff-0000-0000-0000-000000000000']
+    assert report.mismatched_chunks == 3
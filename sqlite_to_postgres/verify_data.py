@@ -0,0 +1,169 @@
+"""Проверка переноса SQLite -> Postgres сравнением хешей пачек.
+
+Обе базы читаются одним последовательным проходом, упорядоченным по id.
+Исходные строки режутся на пачки по chunk_size id, из Postgres в пачку
+попадают все строки с id до последнего id пачки. Пачки сравниваются по хешу,
+и только при расхождении строки сопоставляются поштучно: так находятся
+отсутствующие, лишние и отличающиеся id.
+
+    python verify_data.py [--chunk-size 10000] [--table film_work ...]
+"""
+import os
+import sys
+import sqlite3
+import hashlib
+import argparse
+from contextlib import closing
+from dataclasses import dataclass, field
+from datetime import datetime, date, timezone
+
+import psycopg2
+from psycopg2.extensions import connection as _connection
+from psycopg2.extras import DictCursor
+
+from load_data import TABLES, columns, conn_context
+
+# Разделители значений в строке и строк в пачке при хешировании
+VALUE_SEPARATOR = '\x1f'
+ROW_SEPARATOR = '\x1e'
+
+
+def normalize(value) -> str:
+    """Одинаковое текстовое представление значения из SQLite и из Postgres"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+@dataclass
+class VerificationReport:
+    table: str
+    source_rows: int = 0
+    target_rows: int = 0
+    chunks: int = 0
+    mismatched_chunks: int = 0
+    missing: list = field(default_factory=list)
+    extra: list = field(default_factory=list)
+    mismatched: list = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return not (self.missing or self.extra or self.mismatched)
+
+    def __str__(self):
+        line = (f'{self.table}: {self.source_rows} source rows, {self.target_rows} target rows, '
+                f'{self.mismatched_chunks}/{self.chunks} chunks differ')
+        for name in ('missing', 'extra', 'mismatched'):
+            ids = getattr(self, name)
+            if ids:
+                preview = ', '.join(ids[:5]) + (', ...' if len(ids) > 5 else '')
+                line += f'\n  {name}: {len(ids)} ({preview})'
+        return line
+
+
+def _digest(rows) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    for row in rows:
+        digest.update(row.encode())
+        digest.update(ROW_SEPARATOR.encode())
+    return digest.digest()
+
+
+def _compare(report, source, target):
+    """Поштучное сравнение пачки: source и target — списки (id, нормализованная строка)"""
+    source_rows, target_rows = dict(source), dict(target)
+    report.missing += [row_id for row_id in source_rows if row_id not in target_rows]
+    report.extra += [row_id for row_id in target_rows if row_id not in source_rows]
+    report.mismatched += [
+        row_id for row_id, row in source_rows.items()
+        if row_id in target_rows and target_rows[row_id] != row
+    ]
+
+
+def verify_table(lite_conn: sqlite3.Connection, pg_conn: _connection, table, model,
+                 chunk_size: int = 10000) -> VerificationReport:
+    """Сравнивает таблицу в SQLite и content.<table> в Postgres"""
+    names = columns(model)
+    id_index = names.index('id')
+    column_names = ', '.join(names)
+    report = VerificationReport(table)
+
+    def normalized(records):
+        for record in records:
+            row_id = str(record[id_index]).lower()
+            yield row_id, VALUE_SEPARATOR.join(normalize(value) for value in record)
+
+    lite_curs = lite_conn.cursor()
+    lite_curs.row_factory = None
+    # id в обеих базах — UUID в каноническом виде, поэтому порядок строк совпадает
+    lite_curs.execute(f'SELECT {column_names} FROM {table} ORDER BY id;')
+
+    # именованный курсор читает Postgres порциями, а не весь результат в память
+    with pg_conn.cursor(name=f'verify_{table}') as pg_curs:
+        pg_curs.itersize = chunk_size
+        pg_curs.execute(f'SELECT {column_names} FROM content.{table} ORDER BY id;')
+        target_rows = normalized(pg_curs)
+        pending = next(target_rows, None)
+
+        while True:
+            source = list(normalized(lite_curs.fetchmany(chunk_size)))
+            if not source:
+                break
+            last_id = source[-1][0]
+            target = []
+            while pending is not None and pending[0] <= last_id:
+                target.append(pending)
+                pending = next(target_rows, None)
+
+            report.chunks += 1
+            report.source_rows += len(source)
+            report.target_rows += len(target)
+            if _digest(row for _, row in source) != _digest(row for _, row in target):
+                report.mismatched_chunks += 1
+                _compare(report, source, target)
+
+        # всё, что осталось в Postgres после последнего исходного id, — лишние строки
+        while pending is not None:
+            report.target_rows += 1
+            report.extra.append(pending[0])
+            pending = next(target_rows, None)
+    pg_conn.commit()
+    return report
+
+
+def verify_all(lite_conn: sqlite3.Connection, pg_conn: _connection, tables=None, chunk_size: int = 10000) -> dict:
+    """Отчёты по всем (или перечисленным) таблицам"""
+    return {
+        table: verify_table(lite_conn, pg_conn, table, TABLES[table], chunk_size)
+        for table in (tables or TABLES)
+    }
+
+
+if __name__ == '__main__':
+    lite_path = os.environ.get("DB_NAME_LITE")
+    pg_db = os.environ.get("DB_NAME_PG")
+    usr = os.environ.get("DB_USER")
+    pwd = os.environ.get("DB_PASSWORD")
+    host = os.environ.get("HOST")
+    port = int(os.environ.get("PORT"))
+
+    dsl = {'dbname': pg_db, 'user': usr, 'password': pwd, 'host': host, 'port': port}
+
+    parser = argparse.ArgumentParser(description='Проверка переноса данных из SQLite в Postgres')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='строк в одной сравниваемой пачке')
+    parser.add_argument('--table', action='append', choices=TABLES, help='проверить только эти таблицы')
+    cli = parser.parse_args()
+
+    with conn_context(lite_path) as lite_conn, closing(psycopg2.connect(**dsl, cursor_factory=DictCursor)) as pgre_conn:
+        reports = verify_all(lite_conn, pgre_conn, cli.table, cli.chunk_size)
+    for report in reports.values():
+        print(report)
+    sys.exit(0 if all(report.ok for report in reports.values()) else 1)